@@ -9,4 +9,9 @@ SERVER_PORT = os.getenv("SERVER_PORT", 5000)
 
 if __name__ == "__main__":
     app = create_app()
-    serve(app, host="0.0.0.0", port=SERVER_PORT)  # NOSONAR
+    serve(
+        app,
+        host="0.0.0.0",  # NOSONAR
+        port=SERVER_PORT,
+        threads=app.config["AUDIT_SERVER_THREADS"],
+    )
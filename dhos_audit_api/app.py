@@ -9,8 +9,15 @@ from flask_batteries_included.sqldb import db, init_db
 
 from dhos_audit_api import config
 from dhos_audit_api.blueprint_api import api_blueprint, api_v1_blueprint
+from dhos_audit_api.blueprint_api.write_behind import init_write_behind
 from dhos_audit_api.blueprint_development import development_blueprint
 from dhos_audit_api.helpers.cli import add_cli_command
+from dhos_audit_api.helpers.metrics import init_audit_metrics
+from dhos_audit_api.helpers.partitions import init_partition_maintenance
+from dhos_audit_api.helpers.serialization import init_json_serializer
+from dhos_audit_api.helpers.statement_timeout import init_statement_timeouts
+from dhos_audit_api.helpers.stats_rollup import init_stats_compaction
+from dhos_audit_api.helpers.timing import init_request_timing
 
 
 def create_app(
@@ -34,6 +41,9 @@ def create_app(
     )
     config.apply_config(app)
 
+    # Use the fastest available JSON serializer for responses.
+    init_json_serializer(app)
+
     # Register the API blueprint.
     app.register_blueprint(api_v1_blueprint, url_prefix="/dhos/v1")  # TODO: PLAT-615
     app.register_blueprint(api_blueprint, url_prefix="/dhos/v2")
@@ -42,6 +52,24 @@ def create_app(
     # Configure the SQL database.
     init_db(app=app, testing=testing)
 
+    # Record metrics of the audit API's own, served on /metrics.
+    init_audit_metrics(app)
+
+    # Limit how long the SQL statements of a request may run, if configured.
+    init_statement_timeouts(app)
+
+    # Time the phases of each request, if enabled.
+    init_request_timing(app)
+
+    # Start the write-behind queue for audit events, if enabled.
+    init_write_behind(app)
+
+    # Keep future partitions of the event table in place.
+    init_partition_maintenance(app)
+
+    # Merge the rows the event stats rollup gains as events are inserted.
+    init_stats_compaction(app)
+
     # Development blueprint registration
     if is_not_production_environment():
         app.register_blueprint(development_blueprint)
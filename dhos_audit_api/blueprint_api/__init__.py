@@ -1,13 +1,24 @@
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlencode
 
 import flask
-from flask import Response
+from flask import Response, current_app, request
 from flask_batteries_included.helpers import schema
 from flask_batteries_included.helpers.routes import deprecated_route
 from flask_batteries_included.helpers.security import protected_route
 from flask_batteries_included.helpers.security.endpoint_security import scopes_present
+from sqlalchemy.engine import Row
 
 from dhos_audit_api.blueprint_api import controller
+from dhos_audit_api.helpers import timing
+from dhos_audit_api.helpers.ndjson import (
+    json_array_response,
+    ndjson_requested,
+    ndjson_response,
+    ndjson_text_response,
+)
+from dhos_audit_api.helpers.pagination import encode_cursor
+from dhos_audit_api.helpers.replicas import read_replica
 from dhos_audit_api.models.event import Event
 
 api_blueprint = flask.Blueprint("audit", __name__)
@@ -15,7 +26,8 @@ api_blueprint = flask.Blueprint("audit", __name__)
 
 @api_blueprint.route("/event/<event_uuid>", methods=["GET"])
 @protected_route(scopes_present("read:audit_event"))
-def get_event(event_uuid: str) -> Response:
+@read_replica
+def get_event(event_uuid: str, fields: Optional[List[str]] = None) -> Response:
     """---
     get:
       summary: Get event
@@ -29,6 +41,20 @@ def get_event(event_uuid: str) -> Response:
           schema:
             type: string
             example: '2126393f-c86b-4bf2-9f68-42bb03a7b68a'
+        - name: fields
+          in: query
+          required: false
+          description: >-
+              The fields to return for each event, such as `uuid`, `event_type` or
+              `created`. Sub-keys of the event data can be selected as
+              `event_data.<key>`; those missing from an event are left out.
+          style: form
+          explode: false
+          schema:
+            type: array
+            items:
+              type: string
+            example: [uuid, event_type, created, event_data.patient_id]
       responses:
         '200':
           description: An event
@@ -41,22 +67,30 @@ def get_event(event_uuid: str) -> Response:
             application/json:
               schema: Error
     """
-    return flask.jsonify(controller.get_event(event_uuid))
+    event: Dict = controller.get_event(event_uuid, fields)
+    with timing.phase("serialize"):
+        return flask.jsonify(event)
 
 
 @api_blueprint.route("/event", methods=["GET"])
 @protected_route(scopes_present("read:audit_event"))
+@read_replica
 def get_events(
     creator: Optional[str] = None,
     event_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    format: Optional[str] = None,
+    event_data: Optional[Dict[str, str]] = None,
+    fields: Optional[List[str]] = None,
 ) -> Response:
     """---
     get:
       summary: Get events by filter
       description: >-
-          Get a list of events, filtered by event creator and/or event type
+          Get a list of events, filtered by event creator, event type and/or event data
       tags: [event]
       parameters:
         - name: creator
@@ -87,14 +121,80 @@ def get_events(
           schema:
             type: string
             example: '2020-06-30'
+        - name: limit
+          in: query
+          required: false
+          description: >-
+              The maximum number of events to return in one page. Pages are ordered
+              by creation time, and a `Link` header points at the next page if there
+              may be one.
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 10000
+            example: 1000
+        - name: after
+          in: query
+          required: false
+          description: The opaque cursor taken from the previous page's `Link` header
+          schema:
+            type: string
+            example: 'WyIyMDIwLTA2LTAxVDEyOjAwOjAwIiwgIjIxMjYzOTNmLWM4NmItNGJmMi05ZjY4LTQyYmIwM2E3YjY4YSJd'
+        - name: format
+          in: query
+          required: false
+          description: >-
+              The response format. `ndjson` streams one event per line as it is read
+              from the database, as does an `Accept: application/x-ndjson` header.
+          schema:
+            type: string
+            enum: [json, ndjson]
+            example: ndjson
+        - name: event_data
+          in: query
+          required: false
+          description: >-
+              Event data fields to filter by, e.g. `event_data[patient_uuid]=...`.
+              Only events whose event data contains all of the given values are
+              returned.
+          style: deepObject
+          explode: true
+          schema:
+            type: object
+            additionalProperties:
+              type: string
+            example:
+              patient_uuid: '2e049188-733d-40f6-8db5-b8ae6f5b2911'
+        - name: fields
+          in: query
+          required: false
+          description: >-
+              The fields to return for each event, such as `uuid`, `event_type` or
+              `created`. Sub-keys of the event data can be selected as
+              `event_data.<key>`; those missing from an event are left out.
+          style: form
+          explode: false
+          schema:
+            type: array
+            items:
+              type: string
+            example: [uuid, event_type, created, event_data.patient_id]
       responses:
         '200':
           description: A list of events
+          headers:
+            Link:
+              description: The location of the next page of events, if any
+              schema:
+                type: string
+                example: '</dhos/v2/event?limit=1000&after=WyIyMDIwLTA2LTAxVDEyOjAwOjAwIiwgIjIxMjYzOTNmLWM4NmItNGJmMi05ZjY4LTQyYmIwM2E3YjY4YSJd>; rel="next"'
           content:
             application/json:
               schema:
                 type: array
                 items: EventResponse
+            application/x-ndjson:
+              schema: EventResponse
         default:
           description: >-
               Error, e.g. 400 Bad Request, 404 Not Found, 503 Service Unavailable
@@ -103,9 +203,247 @@ def get_events(
               schema: Error
     """
     schema.get()
-    response = controller.get_events(creator, event_type, start_date, end_date)
+    filters: Dict = {
+        "creator": creator,
+        "event_type": event_type,
+        "start_date": start_date,
+        "end_date": end_date,
+        "limit": limit,
+        "after": after,
+        "event_data": event_data,
+    }
+
+    resp: Response
+    if fields:
+        sparse_rows = controller.stream_event_fields(fields, **filters)
+        if ndjson_requested(format):
+            return ndjson_response(
+                event for event, _, _ in timing.timed_stream("query", sparse_rows)
+            )
+        with timing.phase("query"):
+            sparse_page: List = list(sparse_rows)
+        timing.record_rows("query", len(sparse_page))
+        with timing.phase("serialize"):
+            resp = flask.jsonify([event for event, _, _ in sparse_page])
+        if limit and len(sparse_page) == limit:
+            _, last_created, last_uuid = sparse_page[-1]
+            resp.headers["Link"] = _next_page_link(
+                encode_cursor(last_created, last_uuid)
+            )
+        return resp
+
+    if controller.events_json_from_database():
+        rows: Iterable[Row] = controller.stream_events_json(**filters)
+        if ndjson_requested(format):
+            return ndjson_text_response(
+                row.json for row in timing.timed_stream("query", rows)
+            )
+        if not limit:
+            return json_array_response(
+                row.json for row in timing.timed_stream("query", rows)
+            )
+        with timing.phase("query"):
+            page: List[Row] = list(rows)
+        timing.record_rows("query", len(page))
+        resp = json_array_response([row.json for row in page])
+        if len(page) == limit:
+            resp.headers["Link"] = _next_page_link(
+                encode_cursor(page[-1].created, page[-1].uuid)
+            )
+        return resp
 
-    return flask.jsonify(response)
+    if ndjson_requested(format):
+        return ndjson_response(
+            timing.timed_stream("query", controller.stream_events(**filters))
+        )
+
+    response = controller.get_events(**filters)
+
+    with timing.phase("serialize"):
+        resp = flask.jsonify(response)
+    if limit and len(response) == limit:
+        last: Dict = response[-1]
+        resp.headers["Link"] = _next_page_link(
+            encode_cursor(last["created"], last["uuid"])
+        )
+    return resp
+
+
+@api_blueprint.route("/event/count", methods=["GET"])
+@protected_route(scopes_present("read:audit_event"))
+@read_replica
+def count_events(
+    creator: Optional[str] = None,
+    event_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    event_data: Optional[Dict[str, str]] = None,
+    approximate: bool = False,
+) -> Response:
+    """---
+    get:
+      summary: Count events by filter
+      description: >-
+          Count the events matching the same filters as `GET /dhos/v2/event`, without
+          retrieving them
+      tags: [event]
+      parameters:
+        - name: creator
+          in: query
+          required: false
+          description: The UUID of the event creator to filter by
+          schema:
+            type: string
+            example: '2e049188-733d-40f6-8db5-b8ae6f5b2911'
+        - name: event_type
+          in: query
+          required: false
+          description: The type of the event to filter by
+          schema:
+            type: string
+            example: 'Login Failure'
+        - name: start_date
+          in: query
+          required: false
+          description: The start date in YYYY-MM-DD format (inclusive) of the event to filter by
+          schema:
+            type: string
+            example: '2020-06-01'
+        - name: end_date
+          in: query
+          required: false
+          description: The end date in YYYY-MM-DD format (inclusive) of the event to filter by
+          schema:
+            type: string
+            example: '2020-06-30'
+        - name: event_data
+          in: query
+          required: false
+          description: >-
+              Event data fields to filter by, e.g. `event_data[patient_uuid]=...`.
+              Only events whose event data contains all of the given values are
+              counted.
+          style: deepObject
+          explode: true
+          schema:
+            type: object
+            additionalProperties:
+              type: string
+            example:
+              patient_uuid: '2e049188-733d-40f6-8db5-b8ae6f5b2911'
+        - name: approximate
+          in: query
+          required: false
+          description: >-
+              Return the database's estimate of the count, which is much cheaper than
+              an exact count of a large number of events
+          schema:
+            type: boolean
+            default: false
+            example: true
+      responses:
+        '200':
+          description: The number of matching events
+          content:
+            application/json:
+              schema: EventCountResponse
+        default:
+          description: >-
+              Error, e.g. 400 Bad Request, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    schema.get()
+    return flask.jsonify(
+        controller.count_events(
+            creator,
+            event_type,
+            start_date,
+            end_date,
+            event_data=event_data,
+            approximate=approximate,
+        )
+    )
+
+
+@api_blueprint.route("/event/stats", methods=["GET"])
+@protected_route(scopes_present("read:audit_event"))
+@read_replica
+def get_event_stats(
+    start_date: str,
+    end_date: str,
+    bucket: str = "hour",
+    creator: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> Response:
+    """---
+    get:
+      summary: Get event stats
+      description: >-
+          Get the number of events of each type in each time bucket over a date range
+      tags: [event]
+      parameters:
+        - name: start_date
+          in: query
+          required: true
+          description: The start date in YYYY-MM-DD format (inclusive) of the range
+          schema:
+            type: string
+            example: '2020-06-01'
+        - name: end_date
+          in: query
+          required: true
+          description: The end date in YYYY-MM-DD format (inclusive) of the range
+          schema:
+            type: string
+            example: '2020-06-30'
+        - name: bucket
+          in: query
+          required: false
+          description: The length of the time buckets events are counted in
+          schema:
+            type: string
+            enum: [minute, hour, day]
+            default: hour
+            example: day
+        - name: creator
+          in: query
+          required: false
+          description: The UUID of the event creator to filter by
+          schema:
+            type: string
+            example: '2e049188-733d-40f6-8db5-b8ae6f5b2911'
+        - name: event_type
+          in: query
+          required: false
+          description: The type of the event to filter by
+          schema:
+            type: string
+            example: 'Login Failure'
+      responses:
+        '200':
+          description: >-
+              Event counts by time bucket and type, ordered by time bucket. Buckets
+              without events are left out.
+          content:
+            application/json:
+              schema:
+                type: array
+                items: EventStatsResponse
+        default:
+          description: >-
+              Error, e.g. 400 Bad Request, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    schema.get()
+    return flask.jsonify(
+        controller.get_event_stats(
+            start_date, end_date, bucket, creator=creator, event_type=event_type
+        )
+    )
 
 
 @api_blueprint.route("/event", methods=["POST"])
@@ -137,6 +475,21 @@ def create_event(event_details: Dict) -> Response:
           content:
             application/json:
               schema: EventResponse
+        '202':
+          description: >-
+              New event queued for writing, when the service runs in write-behind
+              mode. The event can be read once it has been flushed to the database.
+          headers:
+            Location:
+              description: The location the event will have once written
+              schema:
+                type: string
+                example: http://localhost/dhos/v1/event/f8d2c136-d2a7-43c4-be9e-3fb882923a58
+        '429':
+          description: The write-behind queue is full, try again later
+          content:
+            application/json:
+              schema: Error
         default:
           description: >-
               Error, e.g. 400 Bad Request, 503 Service Unavailable
@@ -144,14 +497,74 @@ def create_event(event_details: Dict) -> Response:
             application/json:
               schema: Error
     """
-    schema.post(json_in=event_details, **Event.schema())
-    event_uuid: str = controller.create_event(event_details)
+    with timing.phase("validate"):
+        schema.post(json_in=event_details, **Event.schema())
+    if current_app.config["AUDIT_WRITE_BEHIND"]:
+        event_uuid: str = controller.enqueue_event(event_details)
+        status: int = 202
+    else:
+        event_uuid = controller.create_event(event_details)
+        status = 201
 
-    resp: Response = flask.Response(status=201)
+    resp: Response = flask.Response(status=status)
     resp.headers["Location"] = f"/dhos/v2/event/{event_uuid}"
     return resp
 
 
+@api_blueprint.route("/events", methods=["POST"])
+@protected_route(scopes_present("write:audit_event"))
+def create_events(event_details: List[Dict]) -> Response:
+    """---
+    post:
+      summary: Create new events in bulk
+      description: >-
+          Create many audit events in a single request
+      tags: [event]
+      requestBody:
+        description: JSON body containing a list of events
+        required: true
+        content:
+          application/json:
+            schema:
+              type: array
+              minItems: 1
+              maxItems: 10000
+              items:
+                $ref: '#/components/schemas/EventRequest'
+              x-body-name: event_details
+      responses:
+        '201':
+          description: The UUIDs of the new events, in the order they were given
+          content:
+            application/json:
+              schema:
+                type: array
+                items:
+                  type: string
+                  example: 'f8d2c136-d2a7-43c4-be9e-3fb882923a58'
+        default:
+          description: >-
+              Error, e.g. 400 Bad Request, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    with timing.phase("validate"):
+        for event in event_details:
+            schema.post(json_in=event, **Event.schema())
+    event_uuids: List[str] = controller.create_events(event_details)
+
+    resp: Response = flask.jsonify(event_uuids)
+    resp.status_code = 201
+    return resp
+
+
+def _next_page_link(cursor: str) -> str:
+    args: Dict[str, List[str]] = request.args.to_dict(flat=False)
+    args["after"] = [cursor]
+    return f'<{request.path}?{urlencode(args, doseq=True)}>; rel="next"'
+
+
 # TODO: PLAT-615
 
 api_v1_blueprint = flask.Blueprint("audit_v1", __name__)
@@ -160,6 +573,7 @@ api_v1_blueprint = flask.Blueprint("audit_v1", __name__)
 @deprecated_route(superseded_by="GET /dhos/v2/event/<event_id>")
 @api_v1_blueprint.route("/event/<event_id>", methods=["GET"])
 @protected_route(scopes_present("read:audit_event"))
+@read_replica
 def get_event_v1(event_id: str) -> Response:
     """---
     get:
@@ -192,11 +606,13 @@ def get_event_v1(event_id: str) -> Response:
 @deprecated_route(superseded_by="GET /dhos/v2/event")
 @api_v1_blueprint.route("/event", methods=["GET"])
 @protected_route(scopes_present("read:audit_event"))
+@read_replica
 def get_events_v1(
     creator: Optional[str] = None,
     type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    format: Optional[str] = None,
 ) -> Response:
     """---
     get:
@@ -233,6 +649,16 @@ def get_events_v1(
           schema:
             type: string
             example: '2020-06-30'
+        - name: format
+          in: query
+          required: false
+          description: >-
+              The response format. `ndjson` streams one event per line as it is read
+              from the database, as does an `Accept: application/x-ndjson` header.
+          schema:
+            type: string
+            enum: [json, ndjson]
+            example: ndjson
       responses:
         '200':
           description: A list of events
@@ -241,6 +667,8 @@ def get_events_v1(
               schema:
                 type: array
                 items: EventResponseV1
+            application/x-ndjson:
+              schema: EventResponseV1
         default:
           description: >-
               Error, e.g. 400 Bad Request, 404 Not Found, 503 Service Unavailable
@@ -249,9 +677,17 @@ def get_events_v1(
               schema: Error
     """
     schema.get()
-    response = controller.get_events_v1(creator, type, start_date, end_date)
+    if ndjson_requested(format):
+        return ndjson_response(
+            timing.timed_stream(
+                "query",
+                controller.stream_events_v1(creator, type, start_date, end_date),
+            )
+        )
 
-    return flask.jsonify(response)
+    response = controller.get_events_v1(creator, type, start_date, end_date)
+    with timing.phase("serialize"):
+        return flask.jsonify(response)
 
 
 @deprecated_route(superseded_by="POST /dhos/v2/event")
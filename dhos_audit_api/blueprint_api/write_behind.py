@@ -0,0 +1,400 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+import flask
+from flask import Flask, Response, current_app
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import exc, insert
+from sqlalchemy.dialects import postgresql
+
+from dhos_audit_api.helpers import metrics, stats_rollup
+from dhos_audit_api.models.event import Event
+
+SPOOL_SUFFIX = ".ndjson"
+# Held locked by the process spooling to a directory.
+LOCK_FILE = "lock"
+# Subdirectory of the spool for segments that repeatedly failed to insert.
+DEAD_LETTER_DIR = "dead-letter"
+
+
+class EventQueueFullException(Exception):
+    pass
+
+
+class EventWriteQueue:
+    """
+    Bounded in-process queue of new event rows, backed by spool files on local disk.
+
+    Every queued row is appended to the active spool segment and fsynced before the
+    request is answered. The flusher thread periodically swaps in a new segment,
+    inserts the rows of the old one in a single transaction and only then deletes
+    it, so rows survive a crash and are replayed from the spool on the next start.
+    A segment that still fails to insert after `max_attempts` flushes is retried row
+    by row, and the rows that fail on their own are moved to the dead-letter
+    directory, so they do not hold up the rows queued behind them.
+
+    Each process spools to a numbered directory under `spool_dir`, which it keeps
+    locked from start() to stop(). On start it also takes over the segments of any
+    directory no running process holds, such as one left by a crashed process.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        spool_dir: Path,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        enqueue_timeout: float,
+        max_attempts: int,
+    ) -> None:
+        self._app = app
+        self._spool_root = spool_dir
+        self._spool_dir: Optional[Path] = None
+        self._spool_lock: Optional[IO[str]] = None
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._enqueue_timeout = enqueue_timeout
+        self._max_attempts = max_attempts
+
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Rows in the active spool segment, not yet picked up by the flusher.
+        self._pending: List[Dict] = []
+        self._segment: Optional[IO[str]] = None
+        self._segment_path: Optional[Path] = None
+        # Segments picked up by the flusher that have not been committed yet.
+        self._unflushed: List[Tuple[Path, List[Dict]]] = []
+        self._unflushed_count = 0
+        # Failed inserts of each unflushed segment.
+        self._attempts: Dict[Path, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending) + self._unflushed_count
+
+    def enqueue(self, row: Dict) -> None:
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: len(self) < self._max_size, timeout=self._enqueue_timeout
+            ):
+                raise EventQueueFullException("Audit event queue is full")
+
+            segment: IO[str] = self._active_segment()
+            segment.write(json.dumps(row, default=_encode_datetime) + "\n")
+            segment.flush()
+            # Synced outside the lock, so concurrent requests don't wait on each
+            # other's fsync. The duplicate stays open if the flusher closes the segment.
+            fd: int = os.dup(segment.fileno())
+            self._pending.append(row)
+
+            if len(self._pending) >= self._batch_size:
+                self._condition.notify_all()
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self) -> int:
+        """
+        Inserts every queued row, returning how many were written. Rows that fail to
+        insert stay queued (and spooled) and are retried by the next flush, until
+        their segment has failed `max_attempts` times and they fail on their own.
+        """
+        with self._flush_lock:
+            with self._condition:
+                if self._pending:
+                    assert self._segment is not None and self._segment_path is not None
+                    self._segment.close()
+                    self._unflushed.append((self._segment_path, self._pending))
+                    self._unflushed_count += len(self._pending)
+                    self._segment, self._segment_path, self._pending = None, None, []
+
+            flushed = 0
+            while self._unflushed:
+                segment_path, rows = self._unflushed[0]
+                try:
+                    self._insert(rows)
+                except Exception as e:
+                    if _is_transient(e):
+                        raise
+                    attempts: int = self._attempts.get(segment_path, 0) + 1
+                    self._attempts[segment_path] = attempts
+                    if attempts < self._max_attempts:
+                        raise
+                    logger.exception(
+                        "Could not insert %d queued audit events after %d attempts,"
+                        " retrying them one by one",
+                        len(rows),
+                        attempts,
+                    )
+                    failed: List[Dict] = self._insert_singly(rows)
+                    self._dead_letter(segment_path, failed)
+                    metrics.EVENTS_DEAD_LETTERED.inc(len(failed))
+                    flushed += len(rows) - len(failed)
+                else:
+                    segment_path.unlink(missing_ok=True)
+                    flushed += len(rows)
+                self._attempts.pop(segment_path, None)
+                with self._condition:
+                    self._unflushed.pop(0)
+                    self._unflushed_count -= len(rows)
+                    self._condition.notify_all()
+
+            if flushed:
+                logger.debug("Flushed %d queued audit events", flushed)
+            return flushed
+
+    def start(self) -> None:
+        """
+        Claims a spool directory, recovers spooled rows and starts the flusher
+        thread, unless the queue is already running.
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._spool_dir = self._claim_spool_dir()
+            self._recover()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-event-flusher", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+        logger.info("Started audit event write-behind queue in %s", self._spool_dir)
+
+    def stop(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._stopping.set()
+            with self._condition:
+                self._condition.notify_all()
+            self._thread.join()
+            self._thread = None
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush audit events, they remain spooled")
+            with self._condition:
+                if self._segment is not None:
+                    self._segment.close()
+                    self._segment = None
+            # Releases the spool directory, for the next process to take over.
+            assert self._spool_lock is not None
+            self._spool_lock.close()
+            self._spool_lock = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self._batch_size
+                    or self._stopping.is_set(),
+                    timeout=self._flush_interval,
+                )
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush audit events, will retry")
+                self._stopping.wait(self._flush_interval)
+
+    def _active_segment(self) -> IO[str]:
+        if self._spool_dir is None or self._spool_lock is None:
+            raise RuntimeError("Audit event write-behind queue is not running")
+        if self._segment is None:
+            self._segment_path = (
+                self._spool_dir / f"{time.time_ns():020d}-{os.getpid()}{SPOOL_SUFFIX}"
+            )
+            self._segment = self._segment_path.open("a", encoding="utf-8")
+        return self._segment
+
+    def _insert_singly(self, rows: List[Dict]) -> List[Dict]:
+        """
+        Inserts rows one at a time, returning those that fail on their own. A
+        transient error is raised, leaving the whole segment to the next flush; rows
+        inserted before it are skipped there as conflicts in PostgreSQL.
+        """
+        failed: List[Dict] = []
+        for row in rows:
+            try:
+                self._insert([row])
+            except Exception as e:
+                if _is_transient(e):
+                    raise
+                logger.warning(
+                    "Could not insert audit event %s, moving it to the dead-letter"
+                    " directory",
+                    row.get("uuid"),
+                    exc_info=True,
+                )
+                failed.append(row)
+        return failed
+
+    def _dead_letter(self, segment_path: Path, rows: List[Dict]) -> None:
+        """
+        Replaces a segment with a dead-letter segment of the same name holding
+        just `rows`, synced before the segment is deleted.
+        """
+        if rows:
+            dead_letter_dir: Path = self._spool_root / DEAD_LETTER_DIR
+            dead_letter_dir.mkdir(exist_ok=True)
+            with (dead_letter_dir / segment_path.name).open("w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_encode_datetime) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        segment_path.unlink(missing_ok=True)
+
+    def _claim_spool_dir(self) -> Path:
+        slot: int = 0
+        while True:
+            spool_dir: Path = self._spool_root / str(slot)
+            lock: Optional[IO[str]] = _lock_spool_dir(spool_dir)
+            if lock is not None:
+                self._spool_lock = lock
+                return spool_dir
+            slot += 1
+
+    def _recover(self) -> None:
+        assert self._spool_dir is not None
+        # Segments of directories not held by a running process are moved into
+        # this one. Their names include the writing process, so never clash.
+        for spool_dir in sorted(self._spool_root.iterdir()):
+            if spool_dir == self._spool_dir or not spool_dir.name.isdigit():
+                continue
+            lock: Optional[IO[str]] = _lock_spool_dir(spool_dir)
+            if lock is None:
+                continue
+            with lock:
+                for segment_path in spool_dir.glob(f"*{SPOOL_SUFFIX}"):
+                    segment_path.rename(self._spool_dir / segment_path.name)
+
+        for segment_path in sorted(self._spool_dir.glob(f"*{SPOOL_SUFFIX}")):
+            with segment_path.open(encoding="utf-8") as f:
+                rows: List[Dict] = [
+                    _decode_row(json.loads(line)) for line in f if line.strip()
+                ]
+            logger.info(
+                "Recovered %d spooled audit events from %s", len(rows), segment_path
+            )
+            self._unflushed.append((segment_path, rows))
+            self._unflushed_count += len(rows)
+
+    def _insert(self, rows: List[Dict]) -> None:
+        if not rows:
+            return
+        with self._app.app_context():
+            returning: bool = db.engine.dialect.name == "postgresql"
+            if returning:
+                # Rows replayed after a crash may already have been committed, and
+                # must not be counted in the event stats twice either.
+                statement: Any = (
+                    postgresql.insert(Event)
+                    .on_conflict_do_nothing()
+                    .returning(Event.created, Event.event_type, Event.created_by_)
+                )
+            else:
+                statement = insert(Event)
+            inserted: List[Tuple[datetime, str, str]] = []
+            with db.engine.begin() as connection:
+                for i in range(0, len(rows), self._batch_size):
+                    batch: List[Dict] = rows[i : i + self._batch_size]
+                    result = connection.execute(statement.values(batch))
+                    batch_inserted: List[Tuple[datetime, str, str]] = (
+                        result.all()
+                        if returning
+                        else [
+                            (row["created"], row["event_type"], row["created_by_"])
+                            for row in batch
+                        ]
+                    )
+                    stats_rollup.record_event_stats(connection, batch_inserted)
+                    inserted.extend(batch_inserted)
+            metrics.record_events_written(event_type for _, event_type, _ in inserted)
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Whether an insert failed because the database could not be reached, rather
+    than because of the rows, so retrying them is sure to be worthwhile.
+    """
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(
+        error, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+    )
+
+
+def _lock_spool_dir(spool_dir: Path) -> Optional[IO[str]]:
+    """
+    Locks a spool directory for this process, returning the open lock file that
+    holds the lock until closed, or None if another process holds it.
+    """
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    lock: IO[str] = (spool_dir / LOCK_FILE).open("a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def _encode_datetime(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot spool value of type {type(value).__name__}")
+
+
+def _decode_row(row: Dict) -> Dict:
+    return {
+        **row,
+        "created": datetime.fromisoformat(row["created"]),
+        "modified": datetime.fromisoformat(row["modified"]),
+    }
+
+
+def catch_queue_full(error: EventQueueFullException) -> Tuple[Response, int]:
+    logger.warning(str(error))
+    return flask.jsonify({"message": str(error)}), 429
+
+
+def get_queue() -> EventWriteQueue:
+    """
+    The app's write-behind queue, started on first use. Only processes that serve
+    requests use it, so CLI commands and migrations leave the spool alone.
+    """
+    queue: EventWriteQueue = current_app.extensions["event_write_queue"]
+    queue.start()
+    return queue
+
+
+def init_write_behind(app: Flask) -> None:
+    app.register_error_handler(EventQueueFullException, catch_queue_full)
+    if not app.config["AUDIT_WRITE_BEHIND"]:
+        return
+
+    queue = EventWriteQueue(
+        app=app,
+        spool_dir=Path(app.config["AUDIT_WRITE_BEHIND_SPOOL_DIR"]),
+        max_size=app.config["AUDIT_WRITE_BEHIND_QUEUE_SIZE"],
+        batch_size=app.config["AUDIT_WRITE_BEHIND_BATCH_SIZE"],
+        flush_interval=app.config["AUDIT_WRITE_BEHIND_FLUSH_INTERVAL"],
+        enqueue_timeout=app.config["AUDIT_WRITE_BEHIND_ENQUEUE_TIMEOUT"],
+        max_attempts=app.config["AUDIT_WRITE_BEHIND_MAX_ATTEMPTS"],
+    )
+    app.extensions["event_write_queue"] = queue
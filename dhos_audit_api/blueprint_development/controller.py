@@ -1,19 +1,147 @@
-from typing import Dict, List
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
 
+from flask_batteries_included.helpers import generate_uuid
+from flask_batteries_included.helpers.security.jwt import current_jwt_user
 from flask_batteries_included.sqldb import db
+from sqlalchemy import insert, inspect, select
 
+from dhos_audit_api.helpers import stats_rollup
 from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
+
+SEED_COLUMNS = (
+    "uuid",
+    "created",
+    "created_by_",
+    "modified",
+    "modified_by_",
+    "event_type",
+    "event_data",
+)
+SEED_BATCH_SIZE = 1000
+
+
+class _CopyStream(io.TextIOBase):
+    """
+    Read-only file object over an iterator of lines, so COPY can pull rows as it
+    needs them rather than us building the whole payload in memory first.
+    """
+
+    def __init__(self, lines: Iterator[str]) -> None:
+        self._lines = lines
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> str:
+        if size is None:
+            size = -1
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
 
 
 def reset_database() -> None:
     session = db.session
-    session.execute("TRUNCATE TABLE event")
+    tables: List[str] = [Event.__tablename__]
+    if _has_event_stats():
+        tables.append(EventStats.__tablename__)
+    session.execute(f"TRUNCATE TABLE {', '.join(tables)}")
     session.commit()
     session.close()
 
 
 def seed_data(events_data: List[Dict]) -> None:
-    for event_details in events_data:
-        db.session.add(Event(**event_details))
-        db.session.flush()
+    rows: List[Dict] = [_seed_row(event_details) for event_details in events_data]
+    if db.engine.dialect.name == "postgresql":
+        _copy_rows(rows)
+    else:
+        for i in range(0, len(rows), SEED_BATCH_SIZE):
+            db.session.execute(insert(Event), rows[i : i + SEED_BATCH_SIZE])
+    if _has_event_stats():
+        _record_event_stats([row["uuid"] for row in rows])
     db.session.commit()
+
+
+def _has_event_stats() -> bool:
+    # The migration performance tests seed and reset the database at revisions from
+    # before the event stats rollup.
+    return inspect(db.session.connection()).has_table(EventStats.__tablename__)
+
+
+def _record_event_stats(uuids: List[str]) -> None:
+    """
+    Adds seeded events to the rollup, reading them back so that they are counted as
+    stored, whatever format their `created` was given in.
+    """
+    for i in range(0, len(uuids), SEED_BATCH_SIZE):
+        events = db.session.execute(
+            select(Event.created, Event.event_type, Event.created_by_).where(
+                Event.uuid.in_(uuids[i : i + SEED_BATCH_SIZE])
+            )
+        ).all()
+        stats_rollup.record_event_stats(db.session, events)
+
+
+def _seed_row(event_details: Dict) -> Dict:
+    unexpected = set(event_details) - set(SEED_COLUMNS)
+    if unexpected:
+        raise KeyError(f"Unexpected event fields: {', '.join(sorted(unexpected))}")
+
+    now: datetime = datetime.utcnow()
+    user: str = current_jwt_user()
+    return {
+        "uuid": generate_uuid(),
+        "created": now,
+        "created_by_": user,
+        "modified": now,
+        "modified_by_": user,
+        **event_details,
+    }
+
+
+def _copy_rows(rows: List[Dict]) -> None:
+    copy_statement = (
+        f"COPY {Event.__tablename__} ({', '.join(SEED_COLUMNS)}) FROM STDIN"
+    )
+    lines: Iterator[str] = (
+        "\t".join(_copy_value(row[column]) for column in SEED_COLUMNS) + "\n"
+        for row in rows
+    )
+    # COPY runs on the session's own connection so it shares its transaction.
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(copy_statement, _CopyStream(lines))
+    finally:
+        cursor.close()
+
+
+def _copy_value(value: Any) -> str:
+    """Formats a value for the text format of COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        # As is, even for str subclasses such as str enums, whose str() differs.
+        text = str.__str__(value)
+    elif isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
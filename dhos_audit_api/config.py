@@ -1,10 +1,139 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from environs import Env
 from flask import Flask
 
+from dhos_audit_api.helpers.metrics import InstrumentedQueuePool
+from dhos_audit_api.helpers.replicas import replica_binds
+
+env = Env()
+
 
 class Configuration:
-    pass
+    # "orjson" or "stdlib".
+    AUDIT_JSON_SERIALIZER: str = env.str("AUDIT_JSON_SERIALIZER", default="orjson")
+    # Have PostgreSQL render event listings to JSON, bypassing the ORM.
+    AUDIT_EVENTS_JSON_FROM_DATABASE: bool = env.bool(
+        "AUDIT_EVENTS_JSON_FROM_DATABASE", default=True
+    )
+    # Report per-phase timings and row counts of each request in a Server-Timing
+    # header and a log entry.
+    AUDIT_REQUEST_TIMING: bool = env.bool("AUDIT_REQUEST_TIMING", default=False)
+
+    # Write-behind mode for POST /dhos/v2/event: events are spooled to local disk and
+    # inserted in batches by a background thread rather than inside the request.
+    AUDIT_WRITE_BEHIND: bool = env.bool("AUDIT_WRITE_BEHIND", default=False)
+    AUDIT_WRITE_BEHIND_SPOOL_DIR: str = env.str(
+        "AUDIT_WRITE_BEHIND_SPOOL_DIR", default="/tmp/dhos-audit-api-spool"  # nosec
+    )
+    AUDIT_WRITE_BEHIND_QUEUE_SIZE: int = env.int(
+        "AUDIT_WRITE_BEHIND_QUEUE_SIZE", default=10000
+    )
+    AUDIT_WRITE_BEHIND_BATCH_SIZE: int = env.int(
+        "AUDIT_WRITE_BEHIND_BATCH_SIZE", default=500
+    )
+    AUDIT_WRITE_BEHIND_FLUSH_INTERVAL: float = env.float(
+        "AUDIT_WRITE_BEHIND_FLUSH_INTERVAL", default=1.0
+    )
+    # A batch of queued events that fails to insert this many times, other than from
+    # the database being unreachable, is moved aside to the spool's dead-letter dir.
+    AUDIT_WRITE_BEHIND_MAX_ATTEMPTS: int = env.int(
+        "AUDIT_WRITE_BEHIND_MAX_ATTEMPTS", default=5
+    )
+    # How long a request waits for space in a full queue before getting a 429.
+    AUDIT_WRITE_BEHIND_ENQUEUE_TIMEOUT: float = env.float(
+        "AUDIT_WRITE_BEHIND_ENQUEUE_TIMEOUT", default=0.0
+    )
+
+    # Monthly partitions of the event table are created this many months ahead, and
+    # checked every interval (seconds; 0 leaves it to `flask create-event-partitions`).
+    AUDIT_EVENT_PARTITION_MONTHS_AHEAD: int = env.int(
+        "AUDIT_EVENT_PARTITION_MONTHS_AHEAD", default=3
+    )
+    AUDIT_EVENT_PARTITION_CHECK_INTERVAL: float = env.float(
+        "AUDIT_EVENT_PARTITION_CHECK_INTERVAL", default=3600.0
+    )
+
+    # How often (seconds) rows of the event stats rollup are merged; 0 leaves it to
+    # `flask compact-event-stats`.
+    AUDIT_EVENT_STATS_COMPACT_INTERVAL: float = env.float(
+        "AUDIT_EVENT_STATS_COMPACT_INTERVAL", default=60.0
+    )
+
+    # Data migrations rewrite event_data in chunks of this many events, spread over
+    # this many database connections.
+    AUDIT_MIGRATION_CHUNK_SIZE: int = env.int(
+        "AUDIT_MIGRATION_CHUNK_SIZE", default=10000
+    )
+    AUDIT_MIGRATION_WORKERS: int = env.int("AUDIT_MIGRATION_WORKERS", default=4)
+
+    # Comma-separated database URLs of read replicas, to serve the GET routes.
+    AUDIT_READ_REPLICA_URLS: List[str] = env.list("AUDIT_READ_REPLICA_URLS", default=[])
+    # How far (seconds) a replica may lag behind and still serve reads; clients that
+    # wrote within this time read from the primary. 0 means no bound.
+    AUDIT_READ_REPLICA_MAX_STALENESS: float = env.float(
+        "AUDIT_READ_REPLICA_MAX_STALENESS", default=0.0
+    )
+
+    # Threads waitress serves requests on.
+    AUDIT_SERVER_THREADS: int = env.int("AUDIT_SERVER_THREADS", default=4)
+    # Connection pool of each database engine: a connection per server thread, with
+    # overflow for the background threads (write-behind, partition maintenance).
+    AUDIT_DB_POOL_SIZE: int = env.int(
+        "AUDIT_DB_POOL_SIZE", default=AUDIT_SERVER_THREADS
+    )
+    AUDIT_DB_MAX_OVERFLOW: int = env.int("AUDIT_DB_MAX_OVERFLOW", default=4)
+    # Seconds to wait for a connection, and after which connections are replaced.
+    AUDIT_DB_POOL_TIMEOUT: float = env.float("AUDIT_DB_POOL_TIMEOUT", default=30.0)
+    AUDIT_DB_POOL_RECYCLE: int = env.int("AUDIT_DB_POOL_RECYCLE", default=600)
+    AUDIT_DB_POOL_PRE_PING: bool = env.bool("AUDIT_DB_POOL_PRE_PING", default=True)
+
+    # Statement timeouts (milliseconds, 0 for none) for the SQL run by read (GET) and
+    # write requests.
+    AUDIT_READ_STATEMENT_TIMEOUT: int = env.int(
+        "AUDIT_READ_STATEMENT_TIMEOUT", default=0
+    )
+    AUDIT_WRITE_STATEMENT_TIMEOUT: int = env.int(
+        "AUDIT_WRITE_STATEMENT_TIMEOUT", default=0
+    )
 
 
 def apply_config(app: Flask) -> None:
-    # No config to apply
-    pass
+    app.config.from_object(Configuration)
+    # Read replicas are extra binds, with the same engine options as the primary.
+    app.config["SQLALCHEMY_BINDS"] = {
+        **(app.config.get("SQLALCHEMY_BINDS") or {}),
+        **replica_binds(app.config["AUDIT_READ_REPLICA_URLS"]),
+    }
+
+    # SQLite databases (when testing) are not pooled.
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+            **_pool_options(app),
+            "poolclass": InstrumentedQueuePool,
+        }
+
+
+# Engine pool options, with the setting for each and the variable that
+# flask-batteries-included takes it from.
+POOL_OPTIONS: Dict[str, Tuple[str, str]] = {
+    "pool_size": ("AUDIT_DB_POOL_SIZE", "SQLALCHEMY_POOL_SIZE"),
+    "max_overflow": ("AUDIT_DB_MAX_OVERFLOW", "SQLALCHEMY_MAX_OVERFLOW"),
+    "pool_timeout": ("AUDIT_DB_POOL_TIMEOUT", "SQLALCHEMY_POOL_TIMEOUT"),
+    "pool_recycle": ("AUDIT_DB_POOL_RECYCLE", "SQLALCHEMY_POOL_RECYCLE"),
+    "pool_pre_ping": ("AUDIT_DB_POOL_PRE_PING", "SQLALCHEMY_POOL_PRE_PING"),
+}
+
+
+def _pool_options(app: Flask) -> Dict[str, Any]:
+    """
+    The AUDIT_DB_* settings, except where only the flask-batteries-included variable
+    is set in the environment, which then keeps taking effect.
+    """
+    return {
+        option: app.config[setting]
+        for option, (setting, fallback) in POOL_OPTIONS.items()
+        if setting in os.environ or fallback not in os.environ
+    }
@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import flask
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import delete, text, tuple_
+
+from dhos_audit_api.models.event import Event
+
+# Rows fetched per round trip from the server-side cursor while archiving.
+ARCHIVE_BATCH_SIZE = 1000
+
+MONTHLY_PARTITION = re.compile(r"^event_(\d{4})_(\d{2})$")
+
+
+class ArchiveSegment(NamedTuple):
+    path: Path
+    sha256: str
+    row_count: int
+    month: str
+    first_key: Tuple[datetime, str]
+    last_key: Tuple[datetime, str]
+
+
+class _HashingWriter:
+    """File wrapper that hashes everything written through it."""
+
+    def __init__(self, path: Path) -> None:
+        # Never truncate an existing archive, whose rows may already be deleted.
+        self._file = path.open("xb")
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class _SegmentWriter:
+    def __init__(self, path: Path, month: str) -> None:
+        self.path = path
+        self.month = month
+        self.row_count = 0
+        self._first_key: Optional[Tuple[datetime, str]] = None
+        self._last_key: Optional[Tuple[datetime, str]] = None
+        self._file = _HashingWriter(path)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb")  # type: ignore
+
+    def write(self, event: Event) -> None:
+        self._gzip.write((flask.json.dumps(event.to_dict()) + "\n").encode("utf-8"))
+        self._last_key = (event.created, event.uuid)
+        if self._first_key is None:
+            self._first_key = self._last_key
+        self.row_count += 1
+
+    def close(self) -> ArchiveSegment:
+        self._gzip.close()
+        self._file.close()
+        sha256: str = self._file.sha256.hexdigest()
+        with Path(f"{self.path}.sha256").open("x") as f:
+            f.write(f"{sha256}  {self.path.name}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        assert self._first_key is not None and self._last_key is not None
+        return ArchiveSegment(
+            path=self.path,
+            sha256=sha256,
+            row_count=self.row_count,
+            month=self.month,
+            first_key=self._first_key,
+            last_key=self._last_key,
+        )
+
+
+def archive_events(
+    cutoff: datetime,
+    output_dir: Path,
+    segment_size: int,
+    keep_detached: bool = False,
+) -> List[ArchiveSegment]:
+    """
+    Moves events created before the cutoff out of the database into gzipped NDJSON
+    segment files, each with a sha256sum-style checksum file alongside.
+
+    Nothing is removed until every segment has been fsynced, read back and verified.
+    Monthly partitions lying wholly before the cutoff are then detached (and dropped
+    unless `keep_detached`), which is far cheaper than deleting their rows; any
+    other archived rows are deleted segment by segment.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    segments: List[ArchiveSegment] = _write_segments(cutoff, output_dir, segment_size)
+    # The files were synced as they were closed; their directory entries (and the
+    # directory's own, if it was just created) must be too, before rows go.
+    _fsync_dir(output_dir)
+    _fsync_dir(output_dir.resolve().parent)
+    for segment in segments:
+        _verify_segment(segment)
+    logger.info("Archived and verified %d segments", len(segments))
+
+    partitions: Dict[str, str] = _archivable_partitions(cutoff)
+    for segment in segments:
+        if segment.month not in partitions:
+            _delete_segment_rows(segment, cutoff)
+
+    for month, partition in sorted(partitions.items()):
+        archived_rows: int = sum(s.row_count for s in segments if s.month == month)
+        _detach_partition(partition, archived_rows, drop=not keep_detached)
+
+    return segments
+
+
+def _write_segments(
+    cutoff: datetime, output_dir: Path, segment_size: int
+) -> List[ArchiveSegment]:
+    segments: List[ArchiveSegment] = []
+    writer: Optional[_SegmentWriter] = None
+    # Segment names include when the run started, so runs never share a file name.
+    run: str = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+
+    query = (
+        Event.query.filter(Event.created < cutoff)
+        .order_by(Event.created, Event.uuid)
+        .yield_per(ARCHIVE_BATCH_SIZE)
+    )
+    for event in query:
+        # Segments never span months, so each belongs to a single partition.
+        month: str = event.created.strftime("%Y_%m")
+        if writer is None or writer.month != month or writer.row_count >= segment_size:
+            if writer is not None:
+                segments.append(writer.close())
+            path = output_dir / f"event_{month}-{run}-{len(segments) + 1:06d}.ndjson.gz"
+            writer = _SegmentWriter(path, month)
+        writer.write(event)
+
+    if writer is not None:
+        segments.append(writer.close())
+    return segments
+
+
+def _fsync_dir(path: Path) -> None:
+    fd: int = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _verify_segment(segment: ArchiveSegment) -> None:
+    sha256 = hashlib.sha256()
+    with segment.path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    if sha256.hexdigest() != segment.sha256:
+        raise ValueError(f"Checksum mismatch in archive segment {segment.path}")
+
+    with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+        row_count: int = sum(1 for line in f if json.loads(line))
+    if row_count != segment.row_count:
+        raise ValueError(
+            f"Archive segment {segment.path} has {row_count} rows, expected {segment.row_count}"
+        )
+
+
+def _archivable_partitions(cutoff: datetime) -> Dict[str, str]:
+    """Monthly partitions of the event table that lie wholly before the cutoff."""
+    if db.engine.dialect.name != "postgresql":
+        return {}
+
+    partitions: Dict[str, str] = {}
+    rows = db.session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'event'::regclass"
+        )
+    )
+    for (relname,) in rows:
+        match = MONTHLY_PARTITION.match(relname)
+        if match is None:
+            continue
+        year, month = int(match.group(1)), int(match.group(2))
+        partition_end = datetime(year + month // 12, month % 12 + 1, 1)
+        if partition_end <= cutoff:
+            partitions[f"{year:04d}_{month:02d}"] = relname
+    return partitions
+
+
+def _delete_segment_rows(segment: ArchiveSegment, cutoff: datetime) -> None:
+    key = tuple_(Event.created, Event.uuid)
+    result = db.session.execute(
+        delete(Event)
+        .where(key >= segment.first_key, key <= segment.last_key)
+        .where(Event.created < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != segment.row_count:
+        db.session.rollback()
+        raise ValueError(
+            f"Expected to delete {segment.row_count} rows archived in {segment.path}, found {result.rowcount}"
+        )
+    db.session.commit()
+
+
+def _detach_partition(partition: str, archived_rows: int, drop: bool) -> None:
+    quoted: str = db.engine.dialect.identifier_preparer.quote(partition)
+    row_count: int = db.session.execute(text(f"SELECT count(*) FROM {quoted}")).scalar()
+    if row_count != archived_rows:
+        db.session.rollback()
+        raise ValueError(
+            f"Partition {partition} has {row_count} rows but {archived_rows} were archived"
+        )
+
+    db.session.execute(text(f"ALTER TABLE event DETACH PARTITION {quoted}"))
+    if drop:
+        db.session.execute(text(f"DROP TABLE {quoted}"))
+    db.session.commit()
+    logger.info("%s partition %s", "Dropped" if drop else "Detached", partition)
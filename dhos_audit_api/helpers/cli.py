@@ -1,8 +1,18 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
 import click
 from flask import Flask
 from flask_batteries_included.helpers.apispec import generate_openapi_spec
 
 from dhos_audit_api import blueprint_api
+from dhos_audit_api.helpers.archive import archive_events
+from dhos_audit_api.helpers.partitions import create_event_partitions
+from dhos_audit_api.helpers.stats_rollup import (
+    compact_event_stats,
+    rebuild_event_stats,
+)
 from dhos_audit_api.models.api_spec import dhos_audit_api_spec
 
 
@@ -16,3 +26,71 @@ def add_cli_command(app: Flask) -> None:
             blueprint_api.api_blueprint,
             blueprint_api.api_v1_blueprint,
         )
+
+    @app.cli.command("create-event-partitions")
+    @click.option(
+        "--months-ahead",
+        type=int,
+        default=None,
+        help="How many months ahead to create partitions for",
+    )
+    def create_partitions(months_ahead: Optional[int]) -> None:
+        if months_ahead is None:
+            months_ahead = app.config["AUDIT_EVENT_PARTITION_MONTHS_AHEAD"]
+        created: int = create_event_partitions(months_ahead)
+        click.echo(f"Created {created} event partitions")
+
+    @app.cli.command("archive-events")
+    @click.argument("output_dir", type=click.Path(file_okay=False))
+    @click.option(
+        "--older-than-days",
+        type=click.IntRange(min=1),
+        default=90,
+        show_default=True,
+        help="Archive events created more than this many days ago",
+    )
+    @click.option(
+        "--segment-size",
+        type=click.IntRange(min=1),
+        default=100000,
+        show_default=True,
+        help="Maximum number of events per archive segment file",
+    )
+    @click.option(
+        "--keep-detached",
+        is_flag=True,
+        help="Keep archived monthly partitions as detached tables instead of dropping them",
+    )
+    def archive(
+        output_dir: str, older_than_days: int, segment_size: int, keep_detached: bool
+    ) -> None:
+        cutoff: datetime = datetime.utcnow() - timedelta(days=older_than_days)
+        segments = archive_events(
+            cutoff, Path(output_dir), segment_size, keep_detached=keep_detached
+        )
+        archived: int = sum(segment.row_count for segment in segments)
+        click.echo(
+            f"Archived {archived} events created before {cutoff.isoformat()} into {len(segments)} segments"
+        )
+
+    @app.cli.command("rebuild-event-stats")
+    @click.option(
+        "--start-date",
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        required=True,
+        help="The first day (inclusive) to recompute event stats for",
+    )
+    @click.option(
+        "--end-date",
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        required=True,
+        help="The last day (inclusive) to recompute event stats for",
+    )
+    def rebuild_stats(start_date: datetime, end_date: datetime) -> None:
+        written: int = rebuild_event_stats(start_date, end_date + timedelta(days=1))
+        click.echo(f"Rebuilt {written} event stats rows")
+
+    @app.cli.command("compact-event-stats")
+    def compact_stats() -> None:
+        merged: int = compact_event_stats()
+        click.echo(f"Compacted event stats into {merged} rows")
@@ -0,0 +1,26 @@
+from typing import Any, Dict
+
+from flask_batteries_included.sqldb import db
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, with its parameters bound as usual."""
+
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def explain(query: Query) -> Dict:
+    """The top node of PostgreSQL's plan for a query, without running it."""
+    plan: Dict = db.session.execute(Explain(query.statement)).scalar()[0]["Plan"]
+    return plan
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import text
+
+# PostgreSQL advisory lock keys of the maintenance tasks.
+PARTITION_MAINTENANCE_LOCK = 5_726_001
+STATS_COMPACTION_LOCK = 5_726_002
+
+_start_lock = threading.Lock()
+
+
+def lock_task(lock_key: int, wait: bool = True) -> bool:
+    """
+    Takes the advisory lock of a maintenance task until the session's transaction
+    ends, so that only one process runs the task at a time. Without `wait`, returns
+    False straight away if another process holds it. Databases other than
+    PostgreSQL have no advisory locks, and always get it.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return True
+    if wait:
+        db.session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": lock_key}
+        )
+        return True
+    return db.session.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": lock_key}
+    ).scalar()
+
+
+def run_task(lock_key: int, task: Callable[[], Any]) -> bool:
+    """
+    Runs a maintenance task unless another process is running it, returning
+    whether it ran. The task must commit the session, which releases the lock.
+    """
+    if not lock_task(lock_key, wait=False):
+        db.session.rollback()
+        return False
+    task()
+    return True
+
+
+def schedule_task(
+    app: Flask, name: str, interval: float, lock_key: int, task: Callable[[], Any]
+) -> None:
+    """
+    Has start_task() run a maintenance task once the app serves its first request,
+    so that CLI commands and migrations, which serve none, never run it.
+    """
+    pending: Dict[str, Tuple[float, int, Callable[[], Any]]] = (
+        app.extensions.setdefault("maintenance_tasks", {})
+    )
+    if not pending:
+        app.before_request(lambda: _start_pending_tasks(app))
+    pending[name] = (interval, lock_key, task)
+
+
+def _start_pending_tasks(app: Flask) -> None:
+    pending: Dict[str, Tuple[float, int, Callable[[], Any]]] = app.extensions[
+        "maintenance_tasks"
+    ]
+    if not pending:
+        return
+    with _start_lock:
+        while pending:
+            name, (interval, lock_key, task) = pending.popitem()
+            start_task(app, name, interval, lock_key, task)
+
+
+def start_task(
+    app: Flask, name: str, interval: float, lock_key: int, task: Callable[[], Any]
+) -> None:
+    """
+    Runs a maintenance task every `interval` seconds from a background thread.
+    Every process starts one, and each time round whichever gets the task's lock
+    first runs it while the others skip it.
+    """
+
+    def run() -> None:
+        while True:
+            try:
+                with app.app_context():
+                    run_task(lock_key, task)
+            except Exception:
+                logger.warning("Could not run %s", name, exc_info=True)
+            time.sleep(interval)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    app.logger.info("Started %s", name)
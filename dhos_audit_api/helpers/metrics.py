@@ -0,0 +1,186 @@
+import time
+from collections import Counter as CollectionsCounter
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+from dhos_audit_api.helpers.replicas import replica_binds
+
+# These are registered in the default prometheus_client registry, which
+# flask-batteries-included exposes on /metrics along with its per-endpoint request
+# latency histogram (flask_request_latency_seconds).
+EVENTS_WRITTEN = Counter(
+    "audit_events_written_total", "Audit events written", ["event_type"]
+)
+EVENTS_DEAD_LETTERED = Counter(
+    "audit_events_dead_lettered_total",
+    "Queued audit events set aside after repeatedly failing to insert",
+)
+ROWS_RETURNED = Histogram(
+    "audit_query_rows",
+    "Rows returned per event query",
+    ["query"],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+)
+# Connection pool metrics are labelled with the pool: "primary", or the bind of a
+# read replica.
+POOL_CHECKOUT_SECONDS = Histogram(
+    "audit_db_pool_checkout_seconds",
+    "Time spent waiting for a database connection from the pool",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "audit_db_pool_checkout_timeouts_total",
+    "Times no database connection became free within the pool timeout",
+    ["pool"],
+)
+POOL_CONNECTIONS = Gauge(
+    "audit_db_pool_connections",
+    "Database connections in the pool, by state (checked_out or idle)",
+    ["pool", "state"],
+)
+POOL_SATURATION = Gauge(
+    "audit_db_pool_saturation",
+    "Connections checked out as a fraction of the pool size plus overflow",
+    ["pool"],
+)
+POOL_CONNECTION_EVENTS = Counter(
+    "audit_db_pool_connection_events_total",
+    "Database connections opened (connect), closed (close) and invalidated",
+    ["pool", "event"],
+)
+SQL_STATEMENT_SECONDS = Histogram(
+    "audit_sql_statement_seconds",
+    "SQL statement duration",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+T = TypeVar("T")
+
+
+def record_events_written(event_types: Iterable[str]) -> None:
+    """Counts newly committed events by type."""
+    for event_type, count in CollectionsCounter(event_types).items():
+        EVENTS_WRITTEN.labels(event_type).inc(count)
+
+
+def record_rows_returned(query: str, count: int) -> None:
+    ROWS_RETURNED.labels(query).observe(count)
+
+
+def counting_rows(query: str, rows: Iterator[T]) -> Iterator[T]:
+    """
+    Passes through a stream of rows, recording how many there were once the stream
+    is exhausted or closed.
+    """
+    count: int = 0
+    try:
+        for row in rows:
+            count += 1
+            yield row
+    finally:
+        record_rows_returned(query, count)
+
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+    # A connection runs one statement at a time. The start of a statement that
+    # fails is dropped by _handle_error, or else replaced by the next statement's.
+    conn.info["metrics_statement_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+    start: Optional[float] = conn.info.pop("metrics_statement_start", None)
+    if start is None:
+        return
+    operation: str = (statement.split(None, 1) or ["?"])[0].upper()
+    SQL_STATEMENT_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+
+def _handle_error(context: Any) -> None:
+    if context.connection is not None:
+        context.connection.info.pop("metrics_statement_start", None)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that times how long each checkout waits for a connection, which the
+    pool has no event for: "checkout" only fires once a connection has been got.
+    The name its metrics are labelled with is kept when the pool is recreated, as
+    Engine.dispose() does.
+    """
+
+    metrics_name: str = "primary"
+
+    def _do_get(self) -> Any:
+        start: float = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.metrics_name).observe(
+                time.perf_counter() - start
+            )
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool: InstrumentedQueuePool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+def _connection_event_counter(pool_name: str, pool_event: str) -> Callable:
+    def count(*args: Any) -> None:
+        POOL_CONNECTION_EVENTS.labels(pool_name, pool_event).inc()
+
+    return count
+
+
+def _instrument_pool(pool_name: str, engine: Engine, max_overflow: int) -> None:
+    pool: Pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.metrics_name = pool_name
+    # Listeners are carried over to the pool that replaces this one on dispose().
+    # Connections are recycled by closing them and connecting anew.
+    for pool_event in ("connect", "close", "invalidate"):
+        event.listen(pool, pool_event, _connection_event_counter(pool_name, pool_event))
+
+    if isinstance(pool, QueuePool):
+        # Read from the engine's pool when scraped, whichever pool that is by then.
+        capacity: int = pool.size() + max(max_overflow, 0)
+        POOL_CONNECTIONS.labels(pool_name, "checked_out").set_function(
+            lambda: engine.pool.checkedout()
+        )
+        POOL_CONNECTIONS.labels(pool_name, "idle").set_function(
+            lambda: engine.pool.checkedin()
+        )
+        POOL_SATURATION.labels(pool_name).set_function(
+            lambda: engine.pool.checkedout() / capacity
+        )
+
+
+def init_audit_metrics(app: Flask) -> None:
+    """Instruments SQL statements and the connection pools."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+    binds: Dict[str, Optional[str]] = {"primary": None}
+    binds.update(
+        {bind: bind for bind in replica_binds(app.config["AUDIT_READ_REPLICA_URLS"])}
+    )
+    # Whichever setting it came from, see config.apply_config().
+    max_overflow: int = (app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}).get(
+        "max_overflow", 0
+    )
+    with app.app_context():
+        for pool_name, bind in binds.items():
+            _instrument_pool(pool_name, db.get_engine(bind=bind), max_overflow)
@@ -0,0 +1,329 @@
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from alembic import op
+from flask import current_app
+from she_logging import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+# Tracks the progress of each key range of a rewrite, so an interrupted rewrite
+# resumes from the last committed chunk. Rows are removed once a rewrite finishes.
+PROGRESS_TABLE = "event_data_rewrite_progress"
+CREATE_PROGRESS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+    job text NOT NULL,
+    lower_uuid text NOT NULL,
+    upper_uuid text,
+    last_uuid text,
+    done boolean NOT NULL DEFAULT false,
+    rows_updated bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (job, lower_uuid)
+)
+"""
+
+
+def _key_ranges(workers: int) -> List[Tuple[str, Optional[str]]]:
+    """
+    Splits the uuid key space into `workers` contiguous ranges of [lower, upper),
+    evenly for random UUIDs. The first range starts at the empty string and the last
+    has no upper bound, so between them they cover every key.
+    """
+    bounds: List[Any] = [""]
+    bounds += [format(i * 0x10000 // workers, "04x") for i in range(1, workers)]
+    bounds.append(None)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _load_progress(engine: Engine, job: str, workers: int) -> List[Dict]:
+    with engine.begin() as connection:
+        connection.execute(text(CREATE_PROGRESS_TABLE))
+        progress: List[Dict] = [
+            dict(row._mapping)
+            for row in connection.execute(
+                text(f"SELECT * FROM {PROGRESS_TABLE} WHERE job = :job"), {"job": job}
+            )
+        ]
+        if progress:
+            logger.info("Resuming event data rewrite '%s'", job)
+            return progress
+
+        progress = [
+            {
+                "job": job,
+                "lower_uuid": lower,
+                "upper_uuid": upper,
+                "last_uuid": None,
+                "done": False,
+                "rows_updated": 0,
+            }
+            for lower, upper in _key_ranges(workers)
+        ]
+        connection.execute(
+            text(
+                f"INSERT INTO {PROGRESS_TABLE} (job, lower_uuid, upper_uuid) "
+                f"VALUES (:job, :lower_uuid, :upper_uuid)"
+            ),
+            progress,
+        )
+        return progress
+
+
+def _rewrite_range(
+    engine: Engine,
+    progress: Dict,
+    set_expression: str,
+    where: str,
+    chunk_size: int,
+    stop: threading.Event,
+) -> int:
+    updated: int = 0
+    last_uuid: Optional[str] = progress["last_uuid"]
+    upper_uuid: Optional[str] = progress["upper_uuid"]
+    upper: str = "" if upper_uuid is None else "AND uuid < :upper_uuid"
+    with engine.connect() as connection:
+        while not stop.is_set():
+            params: Dict = {
+                "job": progress["job"],
+                "lower_uuid": progress["lower_uuid"],
+                "upper_uuid": upper_uuid,
+                "start": progress["lower_uuid"] if last_uuid is None else last_uuid,
+            }
+            # The range's first chunk includes its lower bound; later chunks start
+            # after the last key of the one before.
+            start: str = "uuid >= :start" if last_uuid is None else "uuid > :start"
+            with connection.begin():
+                chunk_end: Optional[str] = connection.execute(
+                    text(
+                        f"SELECT uuid FROM event WHERE {start} {upper} "
+                        f"ORDER BY uuid OFFSET :offset LIMIT 1"
+                    ),
+                    {**params, "offset": chunk_size - 1},
+                ).scalar()
+                end: str = upper if chunk_end is None else "AND uuid <= :chunk_end"
+                result: Any = connection.execute(
+                    text(
+                        f"UPDATE event SET event_data = {set_expression} "
+                        f"WHERE {start} {end} AND ({where}) "
+                        f"AND event_data IS DISTINCT FROM {set_expression}"
+                    ),
+                    {**params, "chunk_end": chunk_end},
+                )
+                updated += result.rowcount
+                connection.execute(
+                    text(
+                        f"UPDATE {PROGRESS_TABLE} SET last_uuid = :chunk_end, "
+                        f"done = :done, rows_updated = rows_updated + :rows "
+                        f"WHERE job = :job AND lower_uuid = :lower_uuid"
+                    ),
+                    {
+                        **params,
+                        "chunk_end": chunk_end,
+                        "done": chunk_end is None,
+                        "rows": result.rowcount,
+                    },
+                )
+            if chunk_end is None:
+                break
+            last_uuid = chunk_end
+    return updated
+
+
+def rewrite_event_data(
+    engine: Engine,
+    job: str,
+    set_expression: str,
+    where: str = "true",
+    chunk_size: int = 10000,
+    workers: int = 4,
+) -> int:
+    """
+    Sets event_data to `set_expression` (SQL, which may refer to any column of the
+    event) for every event matching `where`, returning how many events changed.
+
+    Rather than one UPDATE of the whole table, the uuid key space is split into
+    ranges that `workers` connections rewrite in parallel, in chunks of `chunk_size`
+    events in uuid order, each committed with a note of how far it got. Locks are
+    only held for a chunk at a time, and running the same `job` again after an
+    interruption carries on from the last committed chunks. Events inserted while the
+    rewrite runs may or may not be rewritten, so the application must already write
+    event_data in its new form.
+    """
+    time_start: float = time.time()
+    progress: List[Dict] = _load_progress(engine, job, workers)
+    pending: List[Dict] = [p for p in progress if not p["done"]]
+    updated: int = sum(p["rows_updated"] for p in progress)
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+        futures: List[Future] = [
+            executor.submit(
+                _rewrite_range, engine, p, set_expression, where, chunk_size, stop
+            )
+            for p in pending
+        ]
+        completed, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in completed:
+            if future.exception() is not None:
+                # Let the other ranges finish their current chunk and stop.
+                stop.set()
+                raise future.exception()  # type: ignore
+    updated += sum(future.result() for future in futures)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(f"DELETE FROM {PROGRESS_TABLE} WHERE job = :job"), {"job": job}
+        )
+        if not connection.execute(text(f"SELECT 1 FROM {PROGRESS_TABLE}")).first():
+            connection.execute(text(f"DROP TABLE {PROGRESS_TABLE}"))
+    logger.info(
+        "Event data rewrite '%s' changed %d events in %.1f seconds",
+        job,
+        updated,
+        time.time() - time_start,
+    )
+    return updated
+
+
+def migrate_event_data(
+    job: str,
+    set_expression: str,
+    where: str = "true",
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    rewrite_event_data() for use in Alembic migrations. The migration's transaction is
+    committed first, so anything it created (such as SQL functions used by
+    `set_expression`) is visible to the worker connections. Chunk size and workers
+    default to AUDIT_MIGRATION_CHUNK_SIZE and AUDIT_MIGRATION_WORKERS.
+    """
+    context: Any = op.get_context()
+    if context.as_sql:
+        # Offline (--sql) migrations get a plain UPDATE.
+        op.execute(
+            f"UPDATE event SET event_data = {set_expression} WHERE {where} "
+            f"AND event_data IS DISTINCT FROM {set_expression}"
+        )
+        return
+
+    if chunk_size is None:
+        chunk_size = current_app.config["AUDIT_MIGRATION_CHUNK_SIZE"]
+    if workers is None:
+        workers = current_app.config["AUDIT_MIGRATION_WORKERS"]
+    bind: Connection = op.get_bind()
+    engine: Engine = create_engine(bind.engine.url, pool_size=workers)
+    try:
+        with context.autocommit_block():
+            rewrite_event_data(engine, job, set_expression, where, chunk_size, workers)
+    finally:
+        engine.dispose()
+
+
+def table_partitions(bind: Connection, table: str) -> List[str]:
+    """The names of the partitions of a partitioned table, in order."""
+    return [
+        row[0]
+        for row in bind.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+            ),
+            {"table": f'"{table}"'},
+        )
+    ]
+
+
+def partition_index_name(partition: str, name: str) -> str:
+    """The name create_index_concurrently() gives a partition's index."""
+    # Identifiers longer than 63 characters would be truncated anyway.
+    return f"{partition}_{name}"[:63]
+
+
+def _index_is_valid(bind: Connection, name: str) -> Optional[bool]:
+    """Whether the named index is valid, or None if there is no such index."""
+    return bind.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": f'"{name}"'},
+    ).scalar()
+
+
+def _build_index_concurrently(
+    bind: Connection, name: str, table: str, definition: str, attempts: int
+) -> None:
+    for attempt in range(1, attempts + 1):
+        valid: Optional[bool] = _index_is_valid(bind, name)
+        if valid:
+            return
+        if valid is not None:
+            # Left behind by a failed or interrupted concurrent build.
+            logger.warning("Dropping invalid index %s", name)
+            bind.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        try:
+            bind.execute(
+                text(f'CREATE INDEX CONCURRENTLY "{name}" ON "{table}" {definition}')
+            )
+        except DBAPIError:
+            if attempt == attempts:
+                raise
+            logger.warning(
+                "Building index %s failed (attempt %d of %d)",
+                name,
+                attempt,
+                attempts,
+                exc_info=True,
+            )
+            time.sleep(attempt)
+            continue
+        if _index_is_valid(bind, name):
+            return
+    raise RuntimeError(f"Index {name} is still invalid after {attempts} attempts")
+
+
+def create_index_concurrently(
+    name: str, table: str, definition: str, attempts: int = 3
+) -> None:
+    """
+    Creates an index for an Alembic migration without blocking writes to the table,
+    e.g. create_index_concurrently("ix_event_event_type", "event", "(event_type)").
+
+    CREATE INDEX CONCURRENTLY cannot run in a transaction, so the migration's
+    transaction is committed first. It also cannot target a partitioned table, so
+    there the index is created on the parent alone (ON ONLY) and built concurrently
+    on each partition and attached, after which the parent index becomes valid. A
+    build that fails or leaves an invalid index behind is dropped and tried again,
+    and indexes already built by an interrupted run are kept.
+    """
+    context: Any = op.get_context()
+    if context.as_sql:
+        op.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" {definition}')
+        return
+
+    bind: Connection = op.get_bind()
+    partitioned: bool = (
+        bind.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": f'"{table}"'},
+        ).scalar()
+        == "p"
+    )
+    with context.autocommit_block():
+        if not partitioned:
+            _build_index_concurrently(bind, name, table, definition, attempts)
+            return
+
+        bind.execute(
+            text(f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{table}" {definition}')
+        )
+        for partition in table_partitions(bind, table):
+            partition_index: str = partition_index_name(partition, name)
+            _build_index_concurrently(
+                bind, partition_index, partition, definition, attempts
+            )
+            bind.execute(
+                text(f'ALTER INDEX "{name}" ATTACH PARTITION "{partition_index}"')
+            )
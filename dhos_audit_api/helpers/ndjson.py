@@ -0,0 +1,51 @@
+from typing import Dict, Iterable, Iterator, Optional
+
+import flask
+from flask import Response, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def ndjson_requested(format: Optional[str] = None) -> bool:
+    """
+    Whether the caller asked for newline-delimited JSON, either with the `format`
+    query parameter or with an Accept header preferring it over plain JSON.
+    """
+    if format is not None:
+        return format == "ndjson"
+    best_match: Optional[str] = request.accept_mimetypes.best_match(
+        ["application/json", NDJSON_MIMETYPE]
+    )
+    return best_match == NDJSON_MIMETYPE
+
+
+def ndjson_response(rows: Iterable[Dict]) -> Response:
+    """
+    Streams one JSON document per line as each row is produced, so memory use does
+    not grow with the size of the result.
+    """
+
+    return ndjson_text_response(flask.json.dumps(row) for row in rows)
+
+
+def ndjson_text_response(documents: Iterable[str]) -> Response:
+    """Streams already-encoded JSON documents, one per line."""
+
+    def generate() -> Iterator[str]:
+        for document in documents:
+            yield document + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def json_array_response(documents: Iterable[str]) -> Response:
+    """Streams already-encoded JSON documents as the elements of a JSON array."""
+
+    def generate() -> Iterator[str]:
+        separator: str = "["
+        for document in documents:
+            yield separator + document
+            separator = ","
+        yield "[]\n" if separator == "[" else "]\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,24 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created: datetime, uuid: str) -> str:
+    """
+    Builds an opaque cursor from the (created, uuid) keyset of the last event in a page.
+    """
+    created = created.replace(tzinfo=None)
+    raw: bytes = json.dumps([created.isoformat(), uuid]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Reverses encode_cursor, raising a ValueError (i.e. a 400) if the cursor is not one we issued.
+    """
+    try:
+        created, uuid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created), str(uuid)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid pagination cursor '{cursor}'") from e
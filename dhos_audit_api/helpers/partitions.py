@@ -0,0 +1,50 @@
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import text
+
+from dhos_audit_api.helpers.maintenance import (
+    PARTITION_MAINTENANCE_LOCK,
+    lock_task,
+    schedule_task,
+)
+
+
+def create_event_partitions(months_ahead: int) -> int:
+    """
+    Creates any missing monthly partitions of the event table from the current month
+    up to `months_ahead` months ahead, returning how many were created.
+    """
+    lock_task(PARTITION_MAINTENANCE_LOCK)
+    created: int = db.session.execute(
+        text("SELECT create_event_partitions(:months_ahead)"),
+        {"months_ahead": months_ahead},
+    ).scalar()
+    db.session.commit()
+    if created:
+        logger.info("Created %d event table partitions", created)
+    return created
+
+
+def init_partition_maintenance(app: Flask) -> None:
+    """
+    Keeps future event partitions in place from a background thread, so that new
+    events are never routed to the default partition. The thread starts with the
+    first request served.
+    """
+    interval: float = app.config["AUDIT_EVENT_PARTITION_CHECK_INTERVAL"]
+    months_ahead: int = app.config["AUDIT_EVENT_PARTITION_MONTHS_AHEAD"]
+    if (
+        app.testing
+        or interval <= 0
+        or not app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql")
+    ):
+        return
+
+    schedule_task(
+        app,
+        "event-partition-maintenance",
+        interval,
+        PARTITION_MAINTENANCE_LOCK,
+        lambda: create_event_partitions(months_ahead),
+    )
@@ -0,0 +1,160 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+from flask_batteries_included.helpers.security.jwt import current_jwt_user
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
+
+# Each read replica is a Flask-SQLAlchemy bind, named with this prefix and its
+# position in AUDIT_READ_REPLICA_URLS.
+READ_REPLICA_BIND_PREFIX = "read_replica_"
+
+# Replication lag is checked at most this often (seconds) per replica.
+LAG_CHECK_INTERVAL = 1.0
+# A replica that takes longer than this (seconds) to connect to or to answer the lag
+# check counts as unreachable. libpq rounds connect timeouts below 2 up to 2.
+LAG_CHECK_TIMEOUT = 2
+
+# A replica that has replayed all the WAL it has received is up to date, however
+# long ago its last replayed transaction was.
+REPLICATION_LAG_SQL = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+_lock = threading.Lock()
+_next_replica = itertools.count()
+# Replica bind -> (time checked, lag in seconds or None if unreachable).
+_lags: Dict[str, Tuple[float, Optional[float]]] = {}
+# Replica bind -> engine the lag check connects with.
+_lag_check_engines: Dict[str, Engine] = {}
+# Client -> time of their last write.
+_last_writes: Dict[str, float] = {}
+
+
+def replica_binds(urls: List[str]) -> Dict[str, str]:
+    return {f"{READ_REPLICA_BIND_PREFIX}{i}": url for i, url in enumerate(urls)}
+
+
+def _lag_check_engine(bind: str, engine: Engine) -> Engine:
+    """
+    An engine for the replica's lag check, which opens a connection of its own for
+    each check with short timeouts, so that a request checking the lag of an
+    unreachable replica is held up for at most a few seconds.
+    """
+    with _lock:
+        if bind not in _lag_check_engines:
+            _lag_check_engines[bind] = create_engine(
+                engine.url,
+                poolclass=NullPool,
+                connect_args={
+                    "connect_timeout": LAG_CHECK_TIMEOUT,
+                    "options": f"-c statement_timeout={LAG_CHECK_TIMEOUT * 1000}",
+                },
+            )
+        return _lag_check_engines[bind]
+
+
+def _measure_lag(bind: str, engine: Engine) -> Optional[float]:
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    try:
+        with _lag_check_engine(bind, engine).connect() as connection:
+            lag: Any = connection.execute(text(REPLICATION_LAG_SQL)).scalar()
+    except SQLAlchemyError:
+        logger.warning("Read replica is unreachable", exc_info=True)
+        return None
+    # NULL when the database is not a replica at all.
+    return 0.0 if lag is None else float(lag)
+
+
+def _replication_lag(bind: str, engine: Engine) -> Optional[float]:
+    now: float = time.monotonic()
+    with _lock:
+        checked_at, lag = _lags.get(bind, (0.0, None))
+        due: bool = bind not in _lags or now - checked_at >= LAG_CHECK_INTERVAL
+        if due:
+            # Claims the check, so that concurrent requests go on using the last
+            # measurement rather than all checking at once.
+            _lags[bind] = (now, lag)
+    if due:
+        lag = _measure_lag(bind, engine)
+        with _lock:
+            _lags[bind] = (time.monotonic(), lag)
+    return lag
+
+
+def record_write() -> None:
+    """
+    Notes that the current client has just written events, so that their reads go
+    to the primary database until every replica is sure to have the write.
+    """
+    max_staleness: float = current_app.config["AUDIT_READ_REPLICA_MAX_STALENESS"]
+    if not max_staleness or not current_app.config["AUDIT_READ_REPLICA_URLS"]:
+        return
+    now: float = time.monotonic()
+    with _lock:
+        _last_writes[current_jwt_user()] = now
+        if len(_last_writes) > 10000:
+            for client, written in list(_last_writes.items()):
+                if now - written > max_staleness:
+                    del _last_writes[client]
+
+
+def read_replica_engine() -> Optional[Engine]:
+    """
+    The engine of the next reachable read replica in turn, or None to read from the
+    primary. With AUDIT_READ_REPLICA_MAX_STALENESS set, replicas lagging further
+    behind than that are skipped, and clients that wrote within that time read from
+    the primary, so they see their own writes.
+    """
+    urls: List[str] = current_app.config["AUDIT_READ_REPLICA_URLS"]
+    if not urls:
+        return None
+    max_staleness: float = current_app.config["AUDIT_READ_REPLICA_MAX_STALENESS"]
+    if max_staleness:
+        written: Optional[float] = _last_writes.get(current_jwt_user())
+        if written is not None and time.monotonic() - written <= max_staleness:
+            return None
+
+    binds: List[str] = list(replica_binds(urls))
+    start: int = next(_next_replica)
+    for i in range(len(binds)):
+        bind: str = binds[(start + i) % len(binds)]
+        engine: Engine = db.get_engine(bind=bind)
+        lag: Optional[float] = _replication_lag(bind, engine)
+        if lag is None or (max_staleness and lag > max_staleness):
+            continue
+        return engine
+    logger.warning("No read replica available, reading from the primary database")
+    return None
+
+
+def read_replica(view: Callable) -> Callable:
+    """
+    Routes the database reads of a view to a read replica, if any are configured.
+    Goes below @protected_route, so the client is known.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # The request's session is bound when it is first created, so a session
+        # already in use stays on the primary. Flask-SQLAlchemy maps each table to
+        # its bind's engine, which would take precedence over `bind`.
+        if not db.session.registry.has():
+            engine: Optional[Engine] = read_replica_engine()
+            if engine is not None:
+                db.session(bind=engine, binds={})
+        return view(*args, **kwargs)
+
+    return wrapper
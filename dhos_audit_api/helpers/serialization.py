@@ -0,0 +1,83 @@
+from datetime import date, datetime
+from typing import Any, Optional
+
+import orjson
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider
+from flask_batteries_included.helpers.timestamp import (
+    parse_date_to_iso8601,
+    parse_datetime_to_iso8601,
+)
+
+
+def format_datetime(dt: datetime) -> str:
+    """
+    Same output as `parse_datetime_to_iso8601`, e.g. 2000-01-01T01:01:01.123Z, but
+    without its three strftime calls, which dominate serialization time otherwise.
+    """
+    if dt.year < 1000:
+        return parse_datetime_to_iso8601(dt)  # type: ignore
+    formatted: str = dt.isoformat(timespec="milliseconds")
+    if formatted.endswith("+00:00"):
+        return formatted[:-6] + "Z"
+    return formatted
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Encodes JSON with orjson. Dates and datetimes are formatted the same way as by
+    the stdlib encoder that flask-batteries-included installs, and keys are sorted
+    as they are by default, so responses are unchanged apart from being faster.
+    """
+
+    @staticmethod
+    def _default(o: Any) -> Any:
+        if isinstance(o, datetime):
+            return format_datetime(o)
+        if isinstance(o, date):
+            return parse_date_to_iso8601(o)
+        return DefaultJSONProvider.default(o)
+
+    def _option(self, indent: bool = False) -> int:
+        option: int = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        sort_keys: Optional[bool] = self._app.config.get("JSON_SORT_KEYS")
+        if sort_keys or (sort_keys is None and self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Arguments such as `cls` only make sense to the stdlib encoder.
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._default, option=self._option()).decode(
+            "utf-8"
+        )
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj: Any = self._prepare_response_obj(args, kwargs)
+        indent: bool = (
+            self.compact is None and self._app.debug
+        ) or self.compact is False
+        return self._app.response_class(
+            orjson.dumps(
+                obj,
+                default=self._default,
+                option=self._option(indent) | orjson.OPT_APPEND_NEWLINE,
+            ),
+            mimetype=self.mimetype,
+        )
+
+
+def init_json_serializer(app: Flask) -> None:
+    """
+    Selects the JSON serializer used by `flask.jsonify` and `flask.json.dumps`.
+    """
+    serializer: str = app.config["AUDIT_JSON_SERIALIZER"]
+    if serializer == "stdlib":
+        return
+    if serializer != "orjson":
+        raise ValueError(f"Unknown JSON serializer '{serializer}'")
+    app.json = OrjsonProvider(app)
+    app.logger.info("Using the orjson JSON serializer")
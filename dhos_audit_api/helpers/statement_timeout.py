@@ -0,0 +1,41 @@
+from typing import Any
+
+from flask import Flask, current_app, has_request_context, request
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def _set_statement_timeout(session: Session, transaction: Any, connection: Any) -> None:
+    if not has_request_context() or connection.dialect.name != "postgresql":
+        return
+    timeout: int = current_app.config[
+        (
+            "AUDIT_READ_STATEMENT_TIMEOUT"
+            if request.method in READ_METHODS
+            else "AUDIT_WRITE_STATEMENT_TIMEOUT"
+        )
+    ]
+    if timeout:
+        # Like SET LOCAL, this lasts until the end of the transaction.
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": f"{timeout}ms"},
+        )
+
+
+def init_statement_timeouts(app: Flask) -> None:
+    """
+    Limits how long each SQL statement of a request may run, with separate limits for
+    read (GET) and write requests, so a runaway listing can't hold up ingestion.
+    PostgreSQL cancels a statement that runs over, and the request fails with a 503.
+    """
+    if not (
+        app.config["AUDIT_READ_STATEMENT_TIMEOUT"]
+        or app.config["AUDIT_WRITE_STATEMENT_TIMEOUT"]
+    ):
+        return
+    if not event.contains(Session, "after_begin", _set_statement_timeout):
+        event.listen(Session, "after_begin", _set_statement_timeout)
+    app.logger.info("Enabled statement timeouts")
@@ -0,0 +1,161 @@
+from collections import Counter
+from datetime import datetime
+from typing import Any, Iterable, List, Tuple
+
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import DateTime, func, insert, literal_column, select, tuple_
+
+from dhos_audit_api.helpers.maintenance import (
+    STATS_COMPACTION_LOCK,
+    lock_task,
+    schedule_task,
+)
+from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
+
+# The date_trunc field event stats are rolled up by.
+ROLLUP_BUCKET = "hour"
+
+
+def bucket_start(created: datetime) -> datetime:
+    return created.replace(minute=0, second=0, microsecond=0)
+
+
+def record_event_stats(
+    connection: Any, events: Iterable[Tuple[datetime, str, str]]
+) -> None:
+    """
+    Adds new events, given as (created, event_type, created_by_), to the rollup. Call
+    it in the transaction that inserts the events, so both commit or neither does.
+    The counts are inserted as new rows rather than added to existing ones, so that
+    concurrent writers never wait on each other's lock of a busy row.
+    """
+    counts: Counter = Counter(
+        (bucket_start(created), event_type, created_by)
+        for created, event_type, created_by in events
+    )
+    if not counts:
+        return
+    connection.execute(
+        insert(EventStats).values(
+            [
+                {
+                    "bucket_start": bucket,
+                    "event_type": event_type,
+                    "created_by_": created_by,
+                    "count": count,
+                }
+                for (bucket, event_type, created_by), count in counts.items()
+            ]
+        )
+    )
+
+
+def compact_event_stats() -> int:
+    """
+    Merges the rollup rows of each hour, type and creator into one, returning how
+    many were merged into. Rows inserted while it runs are left for the next time.
+    """
+    key: Tuple[Any, ...] = (
+        EventStats.bucket_start,
+        EventStats.event_type,
+        EventStats.created_by_,
+    )
+    lock_task(STATS_COMPACTION_LOCK)
+    duplicated = select(*key).group_by(*key).having(func.count() > 1)
+    columns: List[str] = ["bucket_start", "event_type", "created_by_", "count"]
+    if db.engine.dialect.name == "postgresql":
+        # Only the rows actually deleted are summed, however many are inserted
+        # concurrently.
+        deleted: Any = (
+            EventStats.__table__.delete()
+            .where(tuple_(*key).in_(duplicated))
+            .returning(*key, EventStats.count)
+            .cte("deleted")
+        )
+        deleted_key: Tuple[Any, ...] = tuple(
+            deleted.c[column] for column in columns[:3]
+        )
+        merged: int = db.session.execute(
+            insert(EventStats).from_select(
+                columns,
+                select(*deleted_key, func.sum(deleted.c["count"])).group_by(
+                    *deleted_key
+                ),
+            )
+        ).rowcount
+    else:
+        sums: List[Any] = db.session.execute(
+            select(*key, func.sum(EventStats.count))
+            .group_by(*key)
+            .having(func.count() > 1)
+        ).all()
+        db.session.execute(
+            EventStats.__table__.delete().where(tuple_(*key).in_(duplicated))
+        )
+        if sums:
+            db.session.execute(
+                insert(EventStats).values([dict(zip(columns, row)) for row in sums])
+            )
+        merged = len(sums)
+    db.session.commit()
+    if merged:
+        logger.debug("Compacted event stats into %d rows", merged)
+    return merged
+
+
+def init_stats_compaction(app: Flask) -> None:
+    """
+    Compacts the event stats rollup from a background thread, so that it does not
+    grow by rows for every transaction that inserts events. The thread starts with
+    the first request served.
+    """
+    interval: float = app.config["AUDIT_EVENT_STATS_COMPACT_INTERVAL"]
+    if app.testing or interval <= 0:
+        return
+
+    schedule_task(
+        app,
+        "event-stats-compaction",
+        interval,
+        STATS_COMPACTION_LOCK,
+        compact_event_stats,
+    )
+
+
+def rebuild_event_stats(start: datetime, end: datetime) -> int:
+    """
+    Recomputes the rollup for the hours from `start` up to `end` from the event
+    table, e.g. to backfill it. Events inserted into the range while it runs may be
+    counted twice or not at all, so only rebuild ranges that are no longer written to.
+    Returns the number of rollup rows written.
+    """
+    start, end = bucket_start(start), bucket_start(end)
+    db.session.execute(
+        EventStats.__table__.delete().where(
+            EventStats.bucket_start >= start, EventStats.bucket_start < end
+        )
+    )
+    bucket: Any = func.date_trunc(
+        literal_column(f"'{ROLLUP_BUCKET}'"), Event.created, type_=DateTime
+    )
+    counts = (
+        select(bucket, Event.event_type, Event.created_by_, func.count(Event.uuid))
+        .where(Event.created >= start, Event.created < end)
+        .group_by(bucket, Event.event_type, Event.created_by_)
+    )
+    written: int = db.session.execute(
+        insert(EventStats).from_select(
+            ["bucket_start", "event_type", "created_by_", "count"], counts
+        )
+    ).rowcount
+    db.session.commit()
+    logger.info(
+        "Rebuilt %d event stats rows from %s to %s",
+        written,
+        start.isoformat(),
+        end.isoformat(),
+    )
+    return written
@@ -0,0 +1,177 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, Optional, TypeVar
+
+from flask import Flask, Response, g, has_request_context, request
+from she_logging import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Set once any app enables request timing. Until then phase() and record_rows() return
+# straight away, so instrumented code paths cost nothing when timing is disabled.
+_enabled: bool = False
+
+_NULL_PHASE: ContextManager = nullcontext()
+
+T = TypeVar("T")
+
+
+class RequestTimings:
+    """Durations (in seconds) and row counts of the phases of a single request."""
+
+    def __init__(self) -> None:
+        self.start: float = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.rows: Dict[str, int] = {}
+        # Whether the response body is streamed, and the timings logged once it ends.
+        self.streamed: bool = False
+        self.status: Optional[int] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+
+def _current() -> Optional[RequestTimings]:
+    if not _enabled or not has_request_context():
+        return None
+    return g.get("request_timings")
+
+
+def phase(name: str) -> ContextManager:
+    """
+    Times the enclosed block as the named phase of the current request. Time spent
+    in a phase entered more than once per request is summed.
+    """
+    timings: Optional[RequestTimings] = _current()
+    if timings is None:
+        return _NULL_PHASE
+    return _timed(timings, name)
+
+
+@contextmanager
+def _timed(timings: RequestTimings, name: str) -> Iterator[None]:
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def record_rows(name: str, count: int) -> None:
+    """Records the number of rows the named phase of the current request handled."""
+    timings: Optional[RequestTimings] = _current()
+    if timings is not None:
+        timings.rows[name] = timings.rows.get(name, 0) + count
+
+
+def timed_stream(name: str, rows: Iterable[T]) -> Iterator[T]:
+    """
+    Times producing a stream of rows that is read after the response headers have
+    been sent, as the named phase of the current request. The Server-Timing header
+    can then only cover the time before the stream starts, so the request's log
+    entry is written once the stream is exhausted or closed instead.
+    """
+    timings: Optional[RequestTimings] = _current()
+    if timings is None:
+        return iter(rows)
+    timings.streamed = True
+    return _timed_stream(timings, name, iter(rows))
+
+
+def _timed_stream(timings: RequestTimings, name: str, rows: Iterator[T]) -> Iterator[T]:
+    count: int = 0
+    try:
+        while True:
+            start: float = time.perf_counter()
+            try:
+                row: T = next(rows)
+            except StopIteration:
+                break
+            finally:
+                timings.add(name, time.perf_counter() - start)
+            count += 1
+            yield row
+    finally:
+        timings.rows[name] = timings.rows.get(name, 0) + count
+        timings.durations["total"] = time.perf_counter() - timings.start
+        _log_timings(timings)
+
+
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    if _current() is not None:
+        conn.info["statement_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, *args: Any) -> None:
+    timings: Optional[RequestTimings] = _current()
+    start: Optional[float] = conn.info.pop("statement_start", None)
+    if timings is not None and start is not None:
+        timings.add("sql", time.perf_counter() - start)
+
+
+def _handle_error(context: Any) -> None:
+    # A failed statement never reaches after_cursor_execute.
+    if context.connection is not None:
+        context.connection.info.pop("statement_start", None)
+
+
+def _start_timing() -> None:
+    g.request_timings = RequestTimings()
+
+
+def _report_timing(response: Response) -> Response:
+    # Left in place for the SQL statements and phases of a streamed response body.
+    timings: Optional[RequestTimings] = g.get("request_timings")
+    if timings is None:
+        return response
+    timings.add("total", time.perf_counter() - timings.start)
+    timings.status = response.status_code
+
+    metrics = []
+    for name, seconds in timings.durations.items():
+        metric: str = f"{name};dur={seconds * 1000:.1f}"
+        if name in timings.rows:
+            metric += f';desc="{timings.rows[name]} rows"'
+        metrics.append(metric)
+    response.headers.add("Server-Timing", ", ".join(metrics))
+
+    if not timings.streamed:
+        _log_timings(timings)
+    return response
+
+
+def _log_timings(timings: RequestTimings) -> None:
+    logger.info(
+        "Request timings",
+        extra={
+            "method": request.method,
+            "path": request.path,
+            "status": timings.status,
+            "streamed": timings.streamed,
+            "timings_ms": {
+                name: round(seconds * 1000, 3)
+                for name, seconds in timings.durations.items()
+            },
+            "rows": timings.rows,
+        },
+    )
+
+
+def init_request_timing(app: Flask) -> None:
+    """
+    Records how long each request spends in SQL statements and the phases of the
+    request marked with phase(), reported in a Server-Timing response header and a
+    log entry per request.
+    """
+    global _enabled
+    if not app.config["AUDIT_REQUEST_TIMING"]:
+        return
+
+    _enabled = True
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_timing)
+    app.after_request(_report_timing)
+    app.logger.info("Enabled request timing")
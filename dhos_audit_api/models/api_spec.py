@@ -75,6 +75,58 @@ class EventResponse(Identifier, EventSchema):
             pass
 
 
+@openapi_schema(dhos_audit_api_spec)
+class EventCountResponse(Schema):
+    class Meta:
+        title = "Event count response"
+        unknown = EXCLUDE
+        ordered = True
+
+        class Dict(TypedDict, total=False):
+            count: int
+            approximate: bool
+
+    count = fields.Integer(
+        required=True,
+        example=42,
+        description="The number of matching events",
+    )
+    approximate = fields.Boolean(
+        required=True,
+        example=False,
+        description="Whether the count is an estimate from database statistics",
+    )
+
+
+@openapi_schema(dhos_audit_api_spec)
+class EventStatsResponse(Schema):
+    class Meta:
+        title = "Event stats response"
+        unknown = EXCLUDE
+        ordered = True
+
+        class Dict(TypedDict, total=False):
+            bucket_start: str
+            event_type: str
+            count: int
+
+    bucket_start = fields.String(
+        required=True,
+        example="2020-06-01T12:00:00.000Z",
+        description="The start of the time bucket",
+    )
+    event_type = fields.String(
+        required=True,
+        example="Login Failure",
+        description="The type of the events",
+    )
+    count = fields.Integer(
+        required=True,
+        example=42,
+        description="The number of events of the type in the time bucket",
+    )
+
+
 # TODO: PLAT-615
 
 
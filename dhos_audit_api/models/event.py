@@ -6,11 +6,23 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 
 class Event(ModelIdentifier, db.Model):
-    event_type = db.Column(db.String, nullable=False, unique=False, index=True)
+    event_type = db.Column(db.String, nullable=False, unique=False)
     event_data = db.Column(JSONB, nullable=False, unique=False)
 
+    # jsonb_path_ops only supports containment queries, which is all the API makes.
     event_data_index = db.Index(
-        "ix_event_event_data", event_data, postgresql_using="gin"
+        "ix_event_event_data",
+        event_data,
+        postgresql_using="gin",
+        postgresql_ops={"event_data": "jsonb_path_ops"},
+    )
+
+    __table_args__ = (
+        # Supports keyset pagination of event listings.
+        db.Index("ix_event_created_uuid", "created", "uuid"),
+        # Support listing events by creator or type within a date range.
+        db.Index("ix_event_created_by_created", "created_by_", "created"),
+        db.Index("ix_event_event_type_created", "event_type", "created"),
     )
 
     @staticmethod
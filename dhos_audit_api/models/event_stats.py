@@ -0,0 +1,25 @@
+from flask_batteries_included.sqldb import db
+
+
+class EventStats(db.Model):
+    """
+    Hourly rollup of the number of events by type and creator, maintained as events
+    are inserted so that statistics never have to be computed from the event table.
+    Each transaction that inserts events adds rows of its own, so an hour, type and
+    creator may have several rows until they are compacted; always sum `count`.
+    """
+
+    __table_args__ = (
+        db.Index(
+            "ix_event_stats_bucket_start_event_type_created_by_",
+            "bucket_start",
+            "event_type",
+            "created_by_",
+        ),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    event_type = db.Column(db.String, nullable=False)
+    created_by_ = db.Column(db.String, nullable=False)
+    count = db.Column(db.BigInteger, nullable=False)
@@ -27,6 +27,16 @@ def post_audit_event_bulk(audit_event_data: List[Dict], jwt: str) -> Response:
     return response
 
 
+def post_audit_events(audit_event_data: List[Dict], jwt: str) -> Response:
+    response = requests.post(
+        f"{base_url}/dhos/v2/events",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json=audit_event_data,
+        timeout=60,
+    )
+    return response
+
+
 def post_audit_event(audit_event_data: Dict, jwt: str) -> Response:
     response = requests.post(
         f"{base_url}/dhos/v2/event",
@@ -47,7 +57,10 @@ def get_audit_event(event_uuid: str, jwt: str) -> Response:
 
 
 def get_audit_events(
-    jwt: str, event_type: Optional[str] = None, creator_uuid: Optional[str] = None
+    jwt: str,
+    event_type: Optional[str] = None,
+    creator_uuid: Optional[str] = None,
+    event_data: Optional[Dict[str, str]] = None,
 ) -> Response:
     params = {}
 
@@ -55,6 +68,8 @@ def get_audit_events(
         params["event_type"] = event_type
     if creator_uuid:
         params["creator_uuid"] = creator_uuid
+    for key, value in (event_data or {}).items():
+        params[f"event_data[{key}]"] = value
 
     response = requests.get(
         f"{base_url}/dhos/v2/event",
@@ -18,3 +18,13 @@ Feature: Data migration performance
     Examples:
       | db_revision_from | db_revision_to | event_data_keys                                                                        | event_data_new_keys                                                        | seconds_max | number_rows |
       | 575920a9e769     | 6538146a372f   | device_uuid,clinician_uuid,patient_uuid,encounter_uuid,epr_encounter_uuid,obs_set_uuid | device_id,clinician_id,patient_id,encounter_id,epr_encounter_id,obs_set_id | 20          | 200000      |
+
+  Scenario: event_data jsonb_path_ops GIN index migration (Please, be patient, it takes time to seed the db.)
+    Given database is downgraded to revision 8f3b2c71d4a9
+    Given 1000000 rows with patient_uuid,clinician_uuid,encounter_uuid keys
+    When I benchmark 20000 inserts and 500 event data lookups as "jsonb_ops"
+    And timing this step
+    And database is upgraded to revision c4e1a9f07b52
+    Then it takes less than 600 seconds to complete
+    When I benchmark 20000 inserts and 500 event data lookups as "jsonb_path_ops"
+    Then the benchmark results for "jsonb_ops" and "jsonb_path_ops" are reported
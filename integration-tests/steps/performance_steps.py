@@ -1,4 +1,5 @@
 import random
+import statistics
 import time
 import uuid
 from typing import Dict, List
@@ -15,6 +16,8 @@ def seed_db(
     event_data_keys: str,
 ) -> None:
     chunk = []
+    # A sample of the seeded event data, to look events up by.
+    context.seeded_event_data = []
     for i in range(number_rows):
         randomly_chosen_keys: List[str] = list(event_data_keys.split(","))
         random.shuffle(randomly_chosen_keys)
@@ -26,8 +29,10 @@ def seed_db(
             "event_data": {key: str(uuid.uuid4()) for key in randomly_chosen_keys},
         }
         chunk.append(event)
+        if i % 1000 == 0:
+            context.seeded_event_data.append(event["event_data"])
 
-        if len(chunk) == 500 or i == number_rows - 1:
+        if len(chunk) == 5000 or i == number_rows - 1:
             response = audit_api_client.post_audit_event_bulk(
                 audit_event_data=chunk, jwt=context.system_jwt
             )
@@ -35,6 +40,58 @@ def seed_db(
             chunk.clear()
 
 
+@when(
+    'I benchmark {number_inserts:d} inserts and {number_lookups:d} event data lookups as "{label}"'
+)
+def benchmark_inserts_and_lookups(
+    context: Context, number_inserts: int, number_lookups: int, label: str
+) -> None:
+    batch_size = 500
+    start_time = time.perf_counter()
+    for batch_start in range(0, number_inserts, batch_size):
+        events = [
+            {
+                "event_type": "Performance Test Event",
+                "event_data": {"patient_uuid": str(uuid.uuid4())},
+            }
+            for _ in range(min(batch_size, number_inserts - batch_start))
+        ]
+        response = audit_api_client.post_audit_events(
+            audit_event_data=events, jwt=context.system_jwt
+        )
+        assert response.status_code == 201
+    inserts_per_second = number_inserts / (time.perf_counter() - start_time)
+
+    latencies: List[float] = []
+    for i in range(number_lookups):
+        event_data: Dict = context.seeded_event_data[i % len(context.seeded_event_data)]
+        key, value = random.choice(list(event_data.items()))
+        start_time = time.perf_counter()
+        response = audit_api_client.get_audit_events(
+            jwt=context.system_jwt, event_data={key: value}
+        )
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        assert response.status_code == 200
+        assert len(response.json()) >= 1
+
+    if not hasattr(context, "benchmarks"):
+        context.benchmarks = {}
+    context.benchmarks[label] = {
+        "inserts per second": inserts_per_second,
+        "lookup p50 (ms)": statistics.median(latencies),
+        "lookup p95 (ms)": statistics.quantiles(latencies, n=20)[-1],
+    }
+
+
+@then('the benchmark results for "{before}" and "{after}" are reported')
+def report_benchmarks(context: Context, before: str, after: str) -> None:
+    print(f"{'':<20}{before:>12}{after:>12}{'change':>10}")
+    for metric, before_value in context.benchmarks[before].items():
+        after_value = context.benchmarks[after][metric]
+        change = (after_value - before_value) / before_value * 100
+        print(f"{metric:<20}{before_value:>12.1f}{after_value:>12.1f}{change:>+9.1f}%")
+
+
 @when("timing this step")
 def timing_step(context: Context) -> None:
     context.start_time = time.time()
@@ -41,7 +41,7 @@ def run_migrations_offline():
 
     """
     url = config.get_main_option("sqlalchemy.url")
-    context.configure(url=url)
+    context.configure(url=url, transaction_per_migration=True)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -73,6 +73,10 @@ def run_migrations_online():
     context.configure(connection=connection,
                       target_metadata=target_metadata,
                       process_revision_directives=process_revision_directives,
+                      # Each migration commits on its own, so a migration can run
+                      # statements such as CREATE INDEX CONCURRENTLY outside of a
+                      # transaction (see dhos_audit_api.helpers.migrations).
+                      transaction_per_migration=True,
                       **current_app.extensions['migrate'].configure_args)
 
     try:
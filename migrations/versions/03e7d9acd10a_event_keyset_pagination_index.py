@@ -0,0 +1,24 @@
+"""Event keyset pagination index
+
+Revision ID: 03e7d9acd10a
+Revises: 6538146a372f
+Create Date: 2026-10-18 16:05:12.418562
+
+"""
+from alembic import op
+
+from dhos_audit_api.helpers.migrations import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = "03e7d9acd10a"
+down_revision = "6538146a372f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_concurrently("ix_event_created_uuid", "event", "(created, uuid)")
+
+
+def downgrade():
+    op.drop_index("ix_event_created_uuid", table_name="event")
@@ -19,15 +19,7 @@ depends_on = None
 
 def upgrade():
     op.add_column("event", sa.Column("event_data", JSONB, nullable=True))
-    op.create_index(
-        "ix_event_event_data",
-        "event",
-        ["event_data"],
-        unique=False,
-        postgresql_using="gin",
-    )
     op.alter_column("event", "type", nullable=False, new_column_name="event_type")
-    op.create_index(op.f("ix_event_event_type"), "event", ["event_type"], unique=False)
 
     query = """
     UPDATE event 
@@ -43,6 +35,8 @@ def upgrade():
     op.drop_column("event", "description")
     op.drop_column("event", "target")
 
+    # The indexes on event_data and event_type are built by 56e23810f879.
+
 
 def downgrade():
     op.add_column(
@@ -52,7 +46,6 @@ def downgrade():
         "event",
         sa.Column("description", sa.VARCHAR(), autoincrement=False, nullable=True),
     )
-    op.drop_index(op.f("ix_event_event_type"), table_name="event")
     op.alter_column("event", "event_type", nullable=False, new_column_name="type")
 
     query = """
@@ -63,5 +56,4 @@ def downgrade():
     op.execute(query)
 
     op.alter_column("event", "description", existing_type=sa.VARCHAR(), nullable=False)
-    op.drop_index("ix_event_event_data", table_name="event")
     op.drop_column("event", "event_data")
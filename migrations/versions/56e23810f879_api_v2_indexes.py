@@ -0,0 +1,30 @@
+"""API v2 indexes
+
+Revision ID: 56e23810f879
+Revises: 26b5dc41edc6
+Create Date: 2026-10-18 20:12:37.104815
+
+Builds the indexes of the API v2 columns without blocking writes to the table. They
+are built in a revision of their own because a concurrent build commits the
+migration it runs in, and the schema changes of 26b5dc41edc6 cannot be run twice.
+Databases that ran 26b5dc41edc6 when it built these indexes itself keep them.
+"""
+from alembic import op
+
+from dhos_audit_api.helpers.migrations import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = "56e23810f879"
+down_revision = "26b5dc41edc6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_concurrently("ix_event_event_data", "event", "USING gin (event_data)")
+    create_index_concurrently("ix_event_event_type", "event", "(event_type)")
+
+
+def downgrade():
+    op.drop_index("ix_event_event_type", table_name="event")
+    op.drop_index("ix_event_event_data", table_name="event")
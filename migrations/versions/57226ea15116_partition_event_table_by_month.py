@@ -0,0 +1,140 @@
+"""Partition event table by month
+
+Revision ID: 57226ea15116
+Revises: 03e7d9acd10a
+Create Date: 2026-10-18 17:20:41.052113
+
+Turns `event` into a table range-partitioned by `created`, one partition per month
+plus a default partition. The primary key becomes (uuid, created) because unique
+constraints on a partitioned table must include the partition key.
+
+`create_event_partitions(months_ahead)` creates any missing partitions from the
+current month onwards; the API calls it periodically (see `helpers/partitions.py`)
+and it can also be run with `flask create-event-partitions`.
+"""
+import time
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "57226ea15116"
+down_revision = "03e7d9acd10a"
+branch_labels = None
+depends_on = None
+
+CREATE_PARTITION_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION create_event_partition(month_start timestamp)
+RETURNS boolean
+LANGUAGE plpgsql
+AS
+$$
+    DECLARE
+        partition_start timestamp := date_trunc('month', month_start);
+        partition_end timestamp := partition_start + interval '1 month';
+        partition_name text := 'event_' || to_char(partition_start, 'YYYY_MM');
+    BEGIN
+        IF to_regclass(partition_name) IS NOT NULL THEN
+            RETURN false;
+        END IF;
+
+        EXECUTE format('CREATE TABLE %I (LIKE event INCLUDING DEFAULTS)', partition_name);
+
+        -- Rows written before the partition existed were routed to the default partition.
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM event_default WHERE created >= %L AND created < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            partition_start, partition_end, partition_name
+        );
+
+        EXECUTE format(
+            'ALTER TABLE event ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, partition_start, partition_end
+        );
+        RETURN true;
+    END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_event_partitions(months_ahead integer)
+RETURNS integer
+LANGUAGE plpgsql
+AS
+$$
+    DECLARE
+        current_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC');
+        created_count integer := 0;
+    BEGIN
+        FOR i IN 0..months_ahead LOOP
+            IF create_event_partition(current_month + make_interval(months => i)) THEN
+                created_count := created_count + 1;
+            END IF;
+        END LOOP;
+        RETURN created_count;
+    END;
+$$;
+"""
+
+
+def upgrade():
+    time_start = time.time()
+
+    op.execute(
+        """
+        ALTER TABLE event RENAME TO event_unpartitioned;
+        ALTER TABLE event_unpartitioned RENAME CONSTRAINT event_pkey TO event_unpartitioned_pkey;
+        ALTER INDEX ix_event_event_data RENAME TO ix_event_unpartitioned_event_data;
+        ALTER INDEX ix_event_event_type RENAME TO ix_event_unpartitioned_event_type;
+        ALTER INDEX ix_event_created_uuid RENAME TO ix_event_unpartitioned_created_uuid;
+
+        CREATE TABLE event (LIKE event_unpartitioned INCLUDING DEFAULTS)
+            PARTITION BY RANGE (created);
+        CREATE TABLE event_default PARTITION OF event DEFAULT;
+        """
+    )
+    op.execute(CREATE_PARTITION_FUNCTIONS)
+
+    # Partitions for every month that already has events, and a few ahead. Indexes
+    # are built after the rows are copied, which is much faster than maintaining
+    # them row by row.
+    op.execute(
+        """
+        SELECT create_event_partition(month_start)
+        FROM generate_series(
+            date_trunc('month', (SELECT min(created) FROM event_unpartitioned)),
+            date_trunc('month', now() AT TIME ZONE 'UTC'),
+            interval '1 month'
+        ) AS month_start;
+
+        SELECT create_event_partitions(3);
+
+        INSERT INTO event SELECT * FROM event_unpartitioned;
+        DROP TABLE event_unpartitioned;
+
+        ALTER TABLE event ADD CONSTRAINT event_pkey PRIMARY KEY (uuid, created);
+        CREATE INDEX ix_event_event_data ON event USING gin (event_data);
+        CREATE INDEX ix_event_event_type ON event (event_type);
+        CREATE INDEX ix_event_created_uuid ON event (created, uuid);
+        """
+    )
+    print(f"Done in {time.time() - time_start} seconds!")
+
+
+def downgrade():
+    time_start = time.time()
+
+    op.execute(
+        """
+        CREATE TABLE event_unpartitioned (LIKE event INCLUDING DEFAULTS);
+        INSERT INTO event_unpartitioned SELECT * FROM event;
+        DROP TABLE event;
+        ALTER TABLE event_unpartitioned RENAME TO event;
+
+        ALTER TABLE event ADD CONSTRAINT event_pkey PRIMARY KEY (uuid);
+        CREATE INDEX ix_event_event_data ON event USING gin (event_data);
+        CREATE INDEX ix_event_event_type ON event (event_type);
+        CREATE INDEX ix_event_created_uuid ON event (created, uuid);
+
+        DROP FUNCTION create_event_partitions(integer);
+        DROP FUNCTION create_event_partition(timestamp);
+        """
+    )
+    print(f"Done in {time.time() - time_start} seconds!")
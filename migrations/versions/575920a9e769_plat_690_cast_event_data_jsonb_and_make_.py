@@ -7,6 +7,8 @@ Create Date: 2020-11-24 15:00:55.737758
 """
 from alembic import op
 
+from dhos_audit_api.helpers.migrations import create_index_concurrently
+
 # revision identifiers, used by Alembic.
 revision = "575920a9e769"
 down_revision = "ee82dc5dbca3"
@@ -21,12 +23,15 @@ def upgrade():
         BEGIN
         IF EXISTS(SELECT * FROM information_schema.columns WHERE table_name = 'event' AND column_name = 'event_data' AND data_type = 'json') THEN
         ALTER TABLE event ALTER COLUMN event_data TYPE jsonb USING event_data::jsonb;
-        CREATE INDEX ix_event_event_data ON event USING GIN (event_data JSONB_OPS);
         END IF;
         END;
         $$;
         """
     )
+    # A no-op where the index already exists.
+    create_index_concurrently(
+        "ix_event_event_data", "event", "USING gin (event_data jsonb_ops)"
+    )
 
 
 def downgrade():
@@ -4,11 +4,15 @@ Revision ID: 6538146a372f
 Revises: 575920a9e769
 Create Date: 2021-01-15 17:43:04.115930
 
+event_data is rewritten in parallel chunks rather than with one UPDATE of the whole
+table, and an interrupted run carries on where it left off.
 """
 import time
 
 from alembic import op
 
+from dhos_audit_api.helpers.migrations import migrate_event_data
+
 # revision identifiers, used by Alembic.
 
 revision = "6538146a372f"
@@ -59,12 +63,12 @@ def upgrade():
             RETURN resulting_json;
         END;
     $$;
-
-    UPDATE event
-    SET event_data = all_entries_change_uuid_to_id(event_data);
     """
 
     conn.execute(query)
+    migrate_event_data(
+        "6538146a372f_upgrade", "all_entries_change_uuid_to_id(event_data)"
+    )
     print(f"Done in {time.time() - time_start} seconds!")
 
 
@@ -110,10 +114,10 @@ def downgrade():
                 RETURN resulting_json;
             END;
         $$;
-
-        UPDATE event
-        SET event_data = all_entries_change_id_to_uuid(event_data);
         """
 
     conn.execute(query)
+    migrate_event_data(
+        "6538146a372f_downgrade", "all_entries_change_id_to_uuid(event_data)"
+    )
     print(f"Done in {time.time() - time_start}!")
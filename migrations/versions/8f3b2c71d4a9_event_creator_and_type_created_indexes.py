@@ -0,0 +1,41 @@
+"""Event creator and type created indexes
+
+Revision ID: 8f3b2c71d4a9
+Revises: b7d2e5a1c9f3
+Create Date: 2026-10-18 18:02:37.615204
+
+Composite indexes for listing events by creator or type within a date range.
+`ix_event_event_type_created` also serves lookups by type alone, so it replaces
+`ix_event_event_type`.
+"""
+import time
+
+from alembic import op
+
+from dhos_audit_api.helpers.migrations import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = "8f3b2c71d4a9"
+down_revision = "b7d2e5a1c9f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    time_start = time.time()
+    create_index_concurrently(
+        "ix_event_created_by_created", "event", "(created_by_, created)"
+    )
+    create_index_concurrently(
+        "ix_event_event_type_created", "event", "(event_type, created)"
+    )
+    op.drop_index("ix_event_event_type", table_name="event")
+    print(f"Done in {time.time() - time_start} seconds!")
+
+
+def downgrade():
+    time_start = time.time()
+    op.create_index("ix_event_event_type", "event", ["event_type"], unique=False)
+    op.drop_index("ix_event_event_type_created", table_name="event")
+    op.drop_index("ix_event_created_by_created", table_name="event")
+    print(f"Done in {time.time() - time_start} seconds!")
@@ -0,0 +1,56 @@
+"""Event stats rollup
+
+Revision ID: b7d2e5a1c9f3
+Revises: 57226ea15116
+Create Date: 2026-10-18 19:26:44.508127
+
+Adds event_stats, an hourly rollup of the number of events by type and creator
+that the API keeps up to date as it inserts events, and backfills it from the
+events already stored. An hour, type and creator may have several rows, which are
+summed when read and merged periodically. Events inserted by instances still running the previous
+release while the migration runs are not counted; `flask rebuild-event-stats`
+recomputes the rollup for a range if that matters.
+"""
+import time
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d2e5a1c9f3"
+down_revision = "57226ea15116"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    time_start = time.time()
+    op.create_table(
+        "event_stats",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("event_type", sa.String(), nullable=False),
+        sa.Column("created_by_", sa.String(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_event_stats_bucket_start_event_type_created_by_",
+        "event_stats",
+        ["bucket_start", "event_type", "created_by_"],
+    )
+    op.execute(
+        """
+        INSERT INTO event_stats (bucket_start, event_type, created_by_, count)
+        SELECT date_trunc('hour', created), event_type, created_by_, count(*)
+        FROM event
+        GROUP BY 1, 2, 3;
+        """
+    )
+    print(f"Done in {time.time() - time_start} seconds!")
+
+
+def downgrade():
+    time_start = time.time()
+    op.drop_table("event_stats")
+    print(f"Done in {time.time() - time_start} seconds!")
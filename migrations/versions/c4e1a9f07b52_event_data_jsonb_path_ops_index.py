@@ -0,0 +1,58 @@
+"""Event data jsonb_path_ops index
+
+Revision ID: c4e1a9f07b52
+Revises: 8f3b2c71d4a9
+Create Date: 2026-10-18 18:41:09.270318
+
+Replaces the jsonb_ops GIN index on event_data with a jsonb_path_ops one, which is
+smaller and faster for the containment (@>) queries the API makes, and cheaper to
+maintain on insert. It does not support the key-exists operators (?, ?| and ?&),
+which nothing uses.
+
+The new index is built alongside the old one with create_index_concurrently(), so
+writes are not blocked while it builds; only the final drop and rename take brief
+locks. Running it again after an interruption keeps the partition indexes already
+built.
+"""
+import time
+
+from alembic import op
+
+from dhos_audit_api.helpers.migrations import (
+    create_index_concurrently,
+    partition_index_name,
+    table_partitions,
+)
+
+# revision identifiers, used by Alembic.
+revision = "c4e1a9f07b52"
+down_revision = "8f3b2c71d4a9"
+branch_labels = None
+depends_on = None
+
+
+def _swap_event_data_index(opclass):
+    create_index_concurrently(
+        "ix_event_event_data_new", "event", f"USING gin (event_data {opclass})"
+    )
+    op.execute(
+        """
+        DROP INDEX ix_event_event_data;
+        ALTER INDEX ix_event_event_data_new RENAME TO ix_event_event_data;
+        """
+    )
+    for partition in table_partitions(op.get_bind(), "event"):
+        index_name = partition_index_name(partition, "ix_event_event_data_new")
+        op.execute(f'ALTER INDEX "{index_name}" RENAME TO "{partition}_event_data_idx"')
+
+
+def upgrade():
+    time_start = time.time()
+    _swap_event_data_index("jsonb_path_ops")
+    print(f"Done in {time.time() - time_start} seconds!")
+
+
+def downgrade():
+    time_start = time.time()
+    _swap_event_data_index("jsonb_ops")
+    print(f"Done in {time.time() - time_start} seconds!")
@@ -2,7 +2,7 @@
 https://sensynehealth.atlassian.net/wiki/spaces/SENS/pages/edit-v2/35455151
 
 Revision ID: ee82dc5dbca3
-Revises: 26b5dc41edc6
+Revises: 56e23810f879
 Create Date: 2020-11-04 15:18:08.051086
 
 """
@@ -12,7 +12,7 @@ from alembic import op
 
 # revision identifiers, used by Alembic.
 revision = "ee82dc5dbca3"
-down_revision = "26b5dc41edc6"
+down_revision = "56e23810f879"
 branch_labels = None
 depends_on = None
 
@@ -0,0 +1,261 @@
+"""
+Benchmarks the audit API in-process against a real PostgreSQL database, and writes
+the results to a JSON report that can be compared across commits, e.g.
+
+    docker run -d -p 15432:5432 -e POSTGRES_USER=dhos-audit -e POSTGRES_DB=dhos-audit \\
+        -e POSTGRES_PASSWORD=TopSecretPassword postgres:12-alpine
+    export DATABASE_HOST=localhost DATABASE_PORT=15432 DATABASE_USER=dhos-audit \\
+        DATABASE_NAME=dhos-audit DATABASE_PASSWORD=TopSecretPassword
+    flask db upgrade
+    python scripts/benchmark_api.py --seed 1000000 --output report.json
+    python scripts/benchmark_api.py --compare report.json
+
+The database must have been migrated, as the schema relies on PostgreSQL features
+(JSONB containment, partitioning) that SQLite does not have. Seeded events are made
+by `generate_pre_v2_sql_data.py` and loaded with COPY.
+"""
+
+import io
+import json
+import math
+import platform
+import subprocess  # nosec
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import click
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_batteries_included.sqldb import db
+from generate_pre_v2_sql_data import COLUMNS, generate_rows
+from jose import jwt as jose_jwt
+from sqlalchemy import text
+from werkzeug.test import TestResponse
+
+from dhos_audit_api.app import create_app
+from dhos_audit_api.helpers.stats_rollup import rebuild_event_stats
+
+# Event types made by generate_pre_v2_sql_data.py, used to filter reads.
+EVENT_TYPE = "Login Failure"
+
+Request = Callable[[], TestResponse]
+
+
+def system_token(app: Flask) -> str:
+    return jose_jwt.encode(
+        {
+            "metadata": {"system_id": "dhos-robot"},
+            "iss": app.config["HS_ISSUER"],
+            "aud": app.config["PROXY_URL"] + "/",
+            "scope": "read:audit_event write:audit_event",
+            "exp": 9_999_999_999,
+        },
+        key=app.config["HS_KEY"],
+        algorithm="HS512",
+    )
+
+
+def seed_events(app: Flask, number: int, batch_size: int = 100000) -> None:
+    with app.app_context():
+        connection: Any = db.engine.raw_connection()
+        try:
+            rows: Iterator[str] = generate_rows(number)
+            for start in range(0, number, batch_size):
+                batch: str = "".join(
+                    f"{row}\n" for _, row in zip(range(batch_size), rows)
+                )
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY event ({', '.join(COLUMNS)}) FROM STDIN",
+                        io.StringIO(batch),
+                    )
+                connection.commit()
+                click.echo(f"Seeded {min(start + batch_size, number)} events")
+        finally:
+            connection.close()
+
+        # Seeded events are spread over the last 10000000 seconds.
+        now: datetime = datetime.utcnow()
+        rebuild_event_stats(now - timedelta(days=120), now + timedelta(hours=1))
+        db.session.execute(text("ANALYZE event"))
+        db.session.commit()
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank: int = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def measure(
+    requests: Iterator[Request], warmup: int, items_per_request: int = 1
+) -> Dict:
+    latencies: List[float] = []
+    start: float = time.perf_counter()
+    for i, request in enumerate(requests):
+        request_start: float = time.perf_counter()
+        response: TestResponse = request()
+        latency: float = time.perf_counter() - request_start
+        if response.status_code >= 400:
+            raise click.ClickException(
+                f"Request failed with {response.status_code}: {response.get_data(as_text=True)}"
+            )
+        if i < warmup:
+            start = time.perf_counter()
+            continue
+        latencies.append(latency)
+    elapsed: float = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "items_per_second": round(len(latencies) * items_per_request / elapsed, 1),
+    }
+
+
+def scenarios(
+    client: FlaskClient, headers: Dict, iterations: int, bulk_size: int
+) -> Iterator[Tuple[str, Iterator[Request], int]]:
+    """Yields (name, requests, items per request) for each scenario."""
+    event: Dict = {
+        "event_type": EVENT_TYPE,
+        "event_data": {"description": "Benchmark event", "source": "benchmark"},
+    }
+    event_v1: Dict = {
+        "type": EVENT_TYPE,
+        "description": "Benchmark event",
+        "source": "benchmark",
+    }
+    today: str = datetime.utcnow().strftime("%Y-%m-%d")
+    week_ago: str = (datetime.utcnow() - timedelta(days=7)).strftime("%Y-%m-%d")
+
+    def repeat(request: Request) -> Iterator[Request]:
+        return (request for _ in range(iterations))
+
+    yield "v2_create_event", repeat(
+        lambda: client.post("/dhos/v2/event", json=event, headers=headers)
+    ), 1
+    yield "v2_create_events_bulk", repeat(
+        lambda: client.post(
+            "/dhos/v2/events", json=[event] * bulk_size, headers=headers
+        )
+    ), bulk_size
+    yield "v1_create_event", repeat(
+        lambda: client.post("/dhos/v1/event", json=event_v1, headers=headers)
+    ), 1
+
+    filtered: str = f"event_type={EVENT_TYPE}&start_date={week_ago}&end_date={today}"
+    yield "v2_get_events_filtered", repeat(
+        lambda: client.get(f"/dhos/v2/event?{filtered}", headers=headers)
+    ), 1
+    yield "v1_get_events_filtered", repeat(
+        lambda: client.get(
+            f"/dhos/v1/event?type={EVENT_TYPE}&start_date={week_ago}&end_date={today}",
+            headers=headers,
+        )
+    ), 1
+    yield "v2_get_events_paginated", pages(
+        client, f"/dhos/v2/event?limit=100&{filtered}", headers, iterations
+    ), 100
+
+
+def pages(
+    client: FlaskClient, first_page: str, headers: Dict, number: int
+) -> Iterator[Request]:
+    """Walks through the pages of a listing, starting over when it runs out."""
+    next_page: Optional[str] = first_page
+    for _ in range(number):
+
+        def request(page: str = next_page or first_page) -> TestResponse:
+            nonlocal next_page
+            response: TestResponse = client.get(page, headers=headers)
+            link: Optional[str] = response.headers.get("Link")
+            next_page = link[1 : link.index(">")] if link else None
+            return response
+
+        yield request
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(  # nosec
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict, baseline: Dict) -> None:
+    click.echo(f"{'scenario':<28}{'p50 ms':>20}{'p99 ms':>20}")
+    for name, result in report["scenarios"].items():
+        before: Optional[Dict] = baseline["scenarios"].get(name)
+        columns: List[str] = []
+        for metric in ("p50_ms", "p99_ms"):
+            if before is None:
+                columns.append(f"{result[metric]:>20}")
+                continue
+            change: float = (result[metric] / before[metric] - 1) * 100
+            columns.append(f"{result[metric]:>11} ({change:+5.1f}%)")
+        click.echo(f"{name:<28}{''.join(columns)}")
+
+
+@click.command()
+@click.option("--seed", default=0, show_default=True, help="Events to seed first")
+@click.option("--iterations", default=200, show_default=True)
+@click.option("--warmup", default=20, show_default=True)
+@click.option("--bulk-size", default=100, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None)
+@click.option(
+    "--compare",
+    "baseline_path",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="A previous report to compare the results to",
+)
+def main(
+    seed: int,
+    iterations: int,
+    warmup: int,
+    bulk_size: int,
+    output: Optional[str],
+    baseline_path: Optional[str],
+) -> None:
+    app: Flask = create_app()
+    if seed:
+        seed_events(app, seed)
+
+    client: FlaskClient = app.test_client()
+    headers: Dict = {"Authorization": f"Bearer {system_token(app)}"}
+    report: Dict = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "warmup": warmup,
+        "bulk_size": bulk_size,
+        "scenarios": {},
+    }
+    with app.app_context():
+        report["events"] = db.session.execute(
+            text("SELECT count(*) FROM event")
+        ).scalar()
+    for name, requests, items_per_request in scenarios(
+        client, headers, iterations + warmup, bulk_size
+    ):
+        report["scenarios"][name] = measure(requests, warmup, items_per_request)
+        click.echo(f"{name:<28}{json.dumps(report['scenarios'][name])}")
+
+    if output:
+        Path(output).write_text(json.dumps(report, indent=2) + "\n")
+    if baseline_path:
+        compare(report, json.loads(Path(baseline_path).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Times serializing a listing of events to a JSON response with the stdlib encoder
+and with orjson, e.g. `python scripts/benchmark_serialization.py --events 100000`.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import click
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from flask_batteries_included.helpers.json import CustomJSONEncoder
+
+from dhos_audit_api.helpers.serialization import OrjsonProvider
+from dhos_audit_api.models.event import Event
+
+
+def make_events(number_events: int) -> List[Dict]:
+    start = datetime.utcnow()
+    events: List[Dict] = []
+    for i in range(number_events):
+        created = start - timedelta(seconds=i)
+        clinician_uuid = str(uuid.uuid4())
+        event = Event(
+            uuid=str(uuid.uuid4()),
+            created=created,
+            created_by_=clinician_uuid,
+            modified=created,
+            modified_by_=clinician_uuid,
+            event_type="Patient information viewed",
+            event_data={
+                "description": f"Patient information viewed by clinician '{clinician_uuid}'",
+                "clinician_id": clinician_uuid,
+                "patient_id": str(uuid.uuid4()),
+                "encounter_id": str(uuid.uuid4()),
+            },
+        )
+        events.append(event.to_dict())
+    return events
+
+
+def best_of(repeat: int, function: Callable[[], object]) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@click.command()
+@click.option("--events", "number_events", default=100000, show_default=True)
+@click.option("--repeat", default=5, show_default=True)
+def main(number_events: int, repeat: int) -> None:
+    app = Flask(__name__)
+    # As set up by flask-batteries-included.
+    app.json_encoder = CustomJSONEncoder
+    providers: Dict[str, JSONProvider] = {
+        "stdlib": DefaultJSONProvider(app),
+        "orjson": OrjsonProvider(app),
+    }
+
+    events: List[Dict] = make_events(number_events)
+    with app.app_context():
+        timings: Dict[str, float] = {
+            name: best_of(repeat, lambda: provider.response(events))
+            for name, provider in providers.items()
+        }
+
+    for name, seconds in timings.items():
+        click.echo(
+            f"{name:<8}{seconds * 1000:>10.1f} ms{seconds / number_events * 1e6:>10.2f} us/event"
+        )
+    click.echo(f"speedup {timings['stdlib'] / timings['orjson']:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
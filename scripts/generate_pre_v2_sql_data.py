@@ -1,7 +1,25 @@
+"""
+Generates random audit events as a psql script that loads them with COPY, e.g.
+
+    python scripts/generate_pre_v2_sql_data.py -n 50000000 -o events.sql.gz
+    python scripts/generate_pre_v2_sql_data.py -n 1000000 --shape v2 -o - | psql
+
+Rows are generated in batches across a pool of processes and written as they
+arrive, so memory use doesn't grow with the number of events. Each batch has its own
+seed derived from --seed, so the same seed gives the same events however many
+processes are used (with times relative to when they were generated).
+"""
+
 import datetime
+import gzip
+import os
 import random
+import sys
 import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import IO, Deque, Dict, Iterator, Optional, Tuple
 
 import click
 
@@ -54,35 +72,79 @@ EVENT_TEMPLATES = (
 )
 
 
-@click.command()
-@click.option(
-    "-t",
-    "--table",
-    default="public.event",
-    help="Target 'schema.table'",
-    type=click.STRING,
+# Event data in the shape written through the v2 API, where event_data holds the
+# fields of the event rather than a description of it.
+V2_EVENT_TEMPLATES = (
+    (
+        "Login Success",
+        """{{"clinician_uuid": "{source}", "device_uuid": "{random_id}"}}""",
+    ),
+    (
+        "Login Failure",
+        """{{"clinician_uuid": "{source}", "device_uuid": "{random_id}", "reason": "invalid password"}}""",
+    ),
+    (
+        "activation",
+        """{{"patient_uuid": "{target}", "clinician_uuid": "{source}", "reason": "Activation code {random_int} used"}}""",
+    ),
+    (
+        "Patient information viewed",
+        """{{"patient_uuid": "{target}", "clinician_uuid": "{source}"}}""",
+    ),
+    (
+        "GDM Patient diabetes type changed",
+        """{{"patient_uuid": "{target}", "clinician_uuid": "{source}", "previous_value": "{random_int}", "new_value": "{random_int}"}}""",
+    ),
+    (
+        "score_system_changed",
+        """{{"encounter_uuid": "{random_id}", "clinician_uuid": "{source}", "previous_score_system": "news2", "new_score_system": "meows", "changed_time": "{random_time}"}}""",
+    ),
 )
-@click.option(
-    "-n",
-    "--number",
-    default=200000,
-    help="Number of records to generate",
-    type=click.INT,
+
+SHAPES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "pre-v2": EVENT_TEMPLATES,
+    "v2": V2_EVENT_TEMPLATES,
+    "mixed": EVENT_TEMPLATES + V2_EVENT_TEMPLATES,
+}
+
+COLUMNS = (
+    "uuid",
+    "created",
+    "modified",
+    "modified_by_",
+    "created_by_",
+    "event_type",
+    "event_data",
 )
-def generate(table: str, number: int):
-    copy_statement = f"COPY {table} (uuid, created, modified, modified_by_, created_by_, event_type, event_data) FROM stdin;"
 
-    rows = []
+
+def generate_rows(
+    number: int,
+    seed: Optional[int] = None,
+    shape: str = "pre-v2",
+    now: Optional[datetime.datetime] = None,
+) -> Iterator[str]:
+    """
+    Yields `number` random events as rows in COPY text format, created over the
+    10000000 seconds before `now`. The same seed and `now` give the same rows.
+    """
+    rng = random.Random(seed)
+    templates = SHAPES[shape]
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    def random_uuid() -> uuid.UUID:
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
     for i in range(number):
-        target = uuid.uuid4()
-        source = uuid.uuid4()
-        random_id = uuid.uuid4()
-        random_int = random.randint(1, 1000000)
+        target = random_uuid()
+        source = random_uuid()
+        random_id = random_uuid()
+        random_int = rng.randint(1, 1000000)
         random_time = (
-            datetime.datetime.utcnow()
-            - datetime.timedelta(seconds=random.randint(1, 10000000))
+            now - datetime.timedelta(seconds=rng.randint(1, 10000000))
         ).isoformat()
-        event = random.choice(EVENT_TEMPLATES)
+        event = rng.choice(templates)
         event_type = event[0]
         event_data = event[1].format(
             target=target,
@@ -91,8 +153,8 @@ def generate(table: str, number: int):
             random_int=random_int,
             random_time=random_time,
         )
-        row = ROW_TEMPLATE.format(
-            uuid=uuid.uuid4(),
+        yield ROW_TEMPLATE.format(
+            uuid=random_uuid(),
             created=random_time,
             modified=random_time,
             modified_by_=source,
@@ -100,17 +162,127 @@ def generate(table: str, number: int):
             event_type=event_type,
             event_data=event_data,
         )
-        rows.append(row)
 
-    fp = Path(__file__).parent.parent / f"{datetime.datetime.utcnow().isoformat()}.sql"
-    with fp.open("w+") as f:
+
+def _generate_batch(args: Tuple[int, int, str, datetime.datetime]) -> str:
+    number, seed, shape, now = args
+    return "".join(f"{row}\n" for row in generate_rows(number, seed, shape, now))
+
+
+def generate_batches(
+    number: int,
+    seed: int,
+    shape: str,
+    processes: Optional[int],
+    batch_size: int,
+) -> Iterator[str]:
+    """
+    Yields the rows of `number` events in batches of up to `batch_size`, generated in
+    parallel. Only a couple of batches per process are generated ahead of the
+    consumer, to bound memory use.
+    """
+    now = datetime.datetime.utcnow()
+    batches: Iterator[Tuple[int, int, str, datetime.datetime]] = (
+        (min(batch_size, number - start), seed + i, shape, now)
+        for i, start in enumerate(range(0, number, batch_size))
+    )
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(processes) as executor:
+        pending: Deque[Future] = deque()
+        for batch in batches:
+            pending.append(executor.submit(_generate_batch, batch))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _open_output(output: Optional[str]) -> IO[str]:
+    if output == "-":
+        return sys.stdout
+    fp = Path(
+        output
+        or Path(__file__).parent.parent
+        / f"{datetime.datetime.utcnow().isoformat()}.sql"
+    )
+    if fp.suffix == ".gz":
+        return gzip.open(fp, "wt", compresslevel=1)
+    return fp.open("w+")
+
+
+@click.command()
+@click.option(
+    "-t",
+    "--table",
+    default="public.event",
+    help="Target 'schema.table'",
+    type=click.STRING,
+)
+@click.option(
+    "-n",
+    "--number",
+    default=200000,
+    help="Number of records to generate",
+    type=click.INT,
+)
+@click.option(
+    "-o",
+    "--output",
+    default=None,
+    help="Output file, gzip-compressed if it ends in .gz, or - for stdout",
+    type=click.STRING,
+)
+@click.option(
+    "--shape",
+    default="pre-v2",
+    help="Shape of the event data",
+    type=click.Choice(sorted(SHAPES)),
+)
+@click.option(
+    "--seed",
+    default=None,
+    help="Random seed, to generate the same events again",
+    type=click.INT,
+)
+@click.option(
+    "-p",
+    "--processes",
+    default=None,
+    help="Number of processes (default: one per CPU)",
+    type=click.INT,
+)
+@click.option(
+    "--batch-size",
+    default=100000,
+    help="Number of records per batch",
+    type=click.INT,
+)
+def generate(
+    table: str,
+    number: int,
+    output: Optional[str],
+    shape: str,
+    seed: Optional[int],
+    processes: Optional[int],
+    batch_size: int,
+) -> None:
+    if seed is None:
+        seed = random.randrange(2**32)
+    click.echo(f"Generating {number} events with seed {seed}", err=True)
+
+    copy_statement = f"COPY {table} ({', '.join(COLUMNS)}) FROM stdin;"
+    f = _open_output(output)
+    try:
         f.write(COPY_CONFIG + "\n")
         f.write(copy_statement + "\n")
-        for row in rows:
-            f.write(row + "\n")
+        for batch in generate_batches(number, seed, shape, processes, batch_size):
+            f.write(batch)
         f.write("\\.\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
 
-    print("Done!")
+    click.echo("Done!", err=True)
 
 
 if __name__ == "__main__":
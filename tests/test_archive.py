@@ -0,0 +1,135 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Generator, List
+
+import pytest
+from flask_batteries_included.helpers import generate_uuid
+from flask_batteries_included.sqldb import db
+
+from dhos_audit_api.helpers import archive
+from dhos_audit_api.helpers.archive import ArchiveSegment, archive_events
+from dhos_audit_api.models.event import Event
+from tests.conftest import CommonValues as Vals
+
+
+@pytest.mark.usefixtures("app_context")
+class TestArchive:
+    @pytest.fixture
+    def test_events(self) -> Generator[List[Event], None, None]:
+        now: datetime = datetime.utcnow()
+        test_objects: List[Dict] = [
+            {
+                "uuid": uuid,
+                "created_by_": Vals.SOMEONE_AWESOME,
+                "modified_by_": Vals.SOMEONE_AWESOME,
+                "event_type": Vals.LOGIN_SUCCESS,
+                "event_data": {"description": Vals.LOGIN_SUCCESS_DESCRIPTION},
+                "created": created,
+                "modified": created,
+            }
+            for uuid, created in [
+                (Vals.UUID_1, now - timedelta(days=200)),
+                (Vals.UUID_2, now - timedelta(days=100)),
+                (Vals.UUID_3, now),
+            ]
+        ]
+        models: List[Event] = [Event(**to) for to in test_objects]
+        db.session.add_all(models)
+        db.session.commit()
+
+        yield models
+
+        Event.query.delete()
+        db.session.commit()
+
+    def test_archive_events(self, test_events: List[Event], tmp_path: Path) -> None:
+        cutoff: datetime = datetime.utcnow() - timedelta(days=90)
+        segments: List[ArchiveSegment] = archive_events(
+            cutoff, tmp_path, segment_size=1000
+        )
+
+        # Events from different months never share a segment.
+        assert [s.row_count for s in segments] == [1, 1]
+        archived: List[Dict] = []
+        for segment in segments:
+            checksum_file = Path(f"{segment.path}.sha256")
+            assert checksum_file.read_text().split() == [
+                segment.sha256,
+                segment.path.name,
+            ]
+            with gzip.open(segment.path, "rt") as f:
+                archived.extend(json.loads(line) for line in f)
+
+        assert [e["uuid"] for e in archived] == [Vals.UUID_1, Vals.UUID_2]
+        assert archived[0]["event_data"] == {
+            "description": Vals.LOGIN_SUCCESS_DESCRIPTION
+        }
+        assert [e.uuid for e in Event.query.all()] == [Vals.UUID_3]
+
+    def test_archive_is_synced_before_rows_are_deleted(
+        self, test_events: List[Event], tmp_path: Path, mocker: Any
+    ) -> None:
+        calls = mocker.Mock()
+        mocker.patch.object(archive.os, "fsync", calls.fsync)
+        mocker.patch.object(
+            archive, "_delete_segment_rows", side_effect=calls.delete_segment_rows
+        )
+        archive_events(datetime.utcnow() - timedelta(days=90), tmp_path, 1000)
+
+        names: List[str] = [name for name, _, _ in calls.mock_calls]
+        # Each segment and checksum file, then the directory and its parent.
+        assert names == ["fsync"] * 6 + ["delete_segment_rows"] * 2
+
+    def test_archive_events_splits_segments(
+        self, test_events: List[Event], tmp_path: Path
+    ) -> None:
+        segments: List[ArchiveSegment] = archive_events(
+            datetime.utcnow() + timedelta(days=1), tmp_path, segment_size=1
+        )
+        assert len(segments) == 3
+        assert len(list(tmp_path.glob("*.ndjson.gz"))) == 3
+        assert Event.query.count() == 0
+
+    def test_archive_events_twice(
+        self, test_events: List[Event], tmp_path: Path
+    ) -> None:
+        late: datetime = test_events[0].created + timedelta(seconds=1)
+        first: List[ArchiveSegment] = archive_events(
+            datetime.utcnow() - timedelta(days=150), tmp_path, segment_size=1000
+        )
+        # An event arriving late for the month the first run archived.
+        late_uuid: str = generate_uuid()
+        db.session.add(
+            Event(
+                uuid=late_uuid,
+                created_by_=Vals.SOMEONE_AWESOME,
+                modified_by_=Vals.SOMEONE_AWESOME,
+                event_type=Vals.LOGIN_SUCCESS,
+                event_data={},
+                created=late,
+                modified=late,
+            )
+        )
+        db.session.commit()
+        second: List[ArchiveSegment] = archive_events(
+            datetime.utcnow() - timedelta(days=150), tmp_path, segment_size=1000
+        )
+
+        assert first[0].month == second[0].month
+        assert first[0].path != second[0].path
+        archived: List[str] = []
+        for path in sorted(tmp_path.glob("*.ndjson.gz")):
+            with gzip.open(path, "rt") as f:
+                archived.extend(json.loads(line)["uuid"] for line in f)
+        assert sorted(archived) == sorted([Vals.UUID_1, late_uuid])
+
+    def test_archive_events_nothing_to_archive(
+        self, test_events: List[Event], tmp_path: Path
+    ) -> None:
+        segments: List[ArchiveSegment] = archive_events(
+            datetime.utcnow() - timedelta(days=365), tmp_path, segment_size=1000
+        )
+        assert segments == []
+        assert Event.query.count() == 3
@@ -0,0 +1,91 @@
+from typing import Any, Dict
+
+import pytest
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+
+from dhos_audit_api.config import POOL_OPTIONS, Configuration, apply_config
+from dhos_audit_api.helpers.metrics import InstrumentedQueuePool
+
+
+class TestPoolConfig:
+    @pytest.fixture()
+    def app(self) -> Flask:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "postgresql://localhost/audit"
+        # As set by flask-batteries-included from the SQLALCHEMY_* variables.
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "pool_size": 10,
+            "max_overflow": 0,
+            "pool_timeout": 30,
+            "pool_recycle": 600,
+            "pool_pre_ping": True,
+            "executemany_mode": "values",
+        }
+        return app
+
+    def test_pool_options(self, app: Flask, monkeypatch: Any) -> None:
+        for setting, fallback in POOL_OPTIONS.values():
+            monkeypatch.delenv(setting, raising=False)
+            monkeypatch.delenv(fallback, raising=False)
+        apply_config(app)
+        options: Dict = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        assert options["pool_size"] == Configuration.AUDIT_DB_POOL_SIZE
+        assert options["max_overflow"] == Configuration.AUDIT_DB_MAX_OVERFLOW
+        assert options["pool_pre_ping"] is True
+        assert options["executemany_mode"] == "values"
+        assert options["poolclass"] is InstrumentedQueuePool
+
+    def test_sqlalchemy_pool_variables_are_kept(
+        self, app: Flask, monkeypatch: Any
+    ) -> None:
+        monkeypatch.delenv("AUDIT_DB_POOL_SIZE", raising=False)
+        monkeypatch.setenv("SQLALCHEMY_POOL_SIZE", "10")
+        monkeypatch.delenv("AUDIT_DB_MAX_OVERFLOW", raising=False)
+        monkeypatch.delenv("SQLALCHEMY_MAX_OVERFLOW", raising=False)
+        apply_config(app)
+        options: Dict = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        assert options["pool_size"] == 10
+        assert options["max_overflow"] == Configuration.AUDIT_DB_MAX_OVERFLOW
+
+    def test_audit_db_variables_take_precedence(
+        self, app: Flask, monkeypatch: Any, mocker: Any
+    ) -> None:
+        monkeypatch.setenv("AUDIT_DB_POOL_SIZE", "6")
+        mocker.patch.object(Configuration, "AUDIT_DB_POOL_SIZE", 6)
+        monkeypatch.setenv("SQLALCHEMY_POOL_SIZE", "10")
+        apply_config(app)
+        assert app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"] == 6
+
+    def test_sqlite_is_not_pooled(self) -> None:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        apply_config(app)
+        assert "SQLALCHEMY_ENGINE_OPTIONS" not in app.config
+
+
+class TestStatementTimeout:
+    @pytest.fixture()
+    def app(self, mocker: Any) -> Flask:
+        """Fixture that creates app for testing, with statement timeouts"""
+        from dhos_audit_api.app import create_app
+
+        mocker.patch.object(Configuration, "AUDIT_READ_STATEMENT_TIMEOUT", 250)
+        mocker.patch.object(Configuration, "AUDIT_WRITE_STATEMENT_TIMEOUT", 2000)
+        return create_app(testing=True, use_pgsql=True, use_sqlite=False)
+
+    @pytest.mark.parametrize(["method", "expected"], [("GET", "250ms"), ("POST", "2s")])
+    def test_statement_timeout(self, app: Flask, method: str, expected: str) -> None:
+        with app.test_request_context(method=method):
+            if db.engine.dialect.name != "postgresql":
+                pytest.skip("Statement timeouts are set on PostgreSQL only")
+            timeout = db.session.execute(text("SHOW statement_timeout")).scalar()
+            db.session.rollback()
+        assert timeout == expected
+
+    def test_get_events(self, client: Any, mock_bearer_validation: Any) -> None:
+        response = client.get(
+            "/dhos/v2/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
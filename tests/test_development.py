@@ -0,0 +1,124 @@
+from datetime import datetime
+from typing import Any, Dict, Generator, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from sqlalchemy import func
+
+from dhos_audit_api.blueprint_development import controller
+from dhos_audit_api.blueprint_development.controller import _copy_value, _CopyStream
+from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
+from tests.conftest import CommonValues as Vals
+
+
+@pytest.mark.usefixtures("app_context")
+class TestSeedData:
+    @pytest.fixture(autouse=True)
+    def jwt_user(self, mocker: Any) -> None:
+        mocker.patch.object(
+            controller, "current_jwt_user", return_value=Vals.SOMEONE_AWESOME.value
+        )
+
+    @pytest.fixture(autouse=True)
+    def cleanup(self, app: Flask) -> Generator[None, None, None]:
+        yield
+        Event.query.delete()
+        EventStats.query.delete()
+        db.session.commit()
+
+    def test_seed_data_rolls_up_event_stats(self) -> None:
+        created = datetime(2020, 6, 1, 12, 30)
+        controller.seed_data(
+            [
+                {"event_type": Vals.LOGIN_SUCCESS.value, "event_data": {}},
+                {"event_type": Vals.LOGIN_SUCCESS.value, "event_data": {}},
+                {
+                    "created": created,
+                    "event_type": Vals.LOGIN_FAILURE.value,
+                    "event_data": {},
+                },
+            ]
+        )
+
+        stats = dict(
+            db.session.query(EventStats.event_type, func.sum(EventStats.count))
+            .group_by(EventStats.event_type)
+            .all()
+        )
+        assert stats == {Vals.LOGIN_SUCCESS: 2, Vals.LOGIN_FAILURE: 1}
+        assert EventStats.query.filter_by(
+            event_type=Vals.LOGIN_FAILURE
+        ).one().bucket_start == datetime(2020, 6, 1, 12)
+
+    @pytest.mark.parametrize("batch_size", [2, controller.SEED_BATCH_SIZE])
+    def test_seed_data_round_trips_special_characters(
+        self, mocker: Any, batch_size: int
+    ) -> None:
+        # On PostgreSQL the rows go through COPY's text format, elsewhere through
+        # batched INSERTs.
+        mocker.patch.object(controller, "SEED_BATCH_SIZE", batch_size)
+        awkward: str = "tab\there\nnewline\r\nbackslash\\ \\N \\t end"
+        events: List[Dict] = [
+            {
+                "uuid": f"seed-{i}",
+                "created_by_": awkward,
+                "event_type": f"{Vals.LOGIN_SUCCESS.value}\t{i}",
+                "event_data": {
+                    "description": awkward,
+                    "nothing": None,
+                    "list": [None, "\\N", "\n"],
+                },
+            }
+            for i in range(5)
+        ]
+        controller.seed_data(events)
+
+        db.session.expire_all()
+        stored: List[Event] = Event.query.order_by(Event.uuid).all()
+        assert [
+            (e.uuid, e.created_by_, e.event_type, e.event_data) for e in stored
+        ] == [
+            (
+                event["uuid"],
+                event["created_by_"],
+                event["event_type"],
+                event["event_data"],
+            )
+            for event in events
+        ]
+
+
+class TestCopyFormat:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            (None, "\\N"),
+            ("\\N", "\\\\N"),
+            ("a\tb\nc\rd", "a\\tb\\nc\\rd"),
+            ("back\\slash", "back\\\\slash"),
+            (datetime(2020, 6, 1, 12, 30, 0, 5), "2020-06-01T12:30:00.000005"),
+            ({"a": "b\tc", "d": None}, '{"a": "b\\\\tc", "d": null}'),
+            (3, "3"),
+            (Vals.LOGIN_SUCCESS, Vals.LOGIN_SUCCESS.value),
+        ],
+    )
+    def test_copy_value(self, value: Any, expected: str) -> None:
+        assert _copy_value(value) == expected
+
+    def test_copy_stream_reads_in_chunks(self) -> None:
+        stream = _CopyStream(iter(["abc\n", "", "defgh\n", "i\n"]))
+        chunks: List[str] = []
+        while True:
+            chunk: str = stream.read(3)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        assert chunks == ["abc", "\nde", "fgh", "\ni\n"]
+
+    @pytest.mark.parametrize("size", [-1, None])
+    def test_copy_stream_reads_everything(self, size: Any) -> None:
+        stream = _CopyStream(iter(["abc\n", "def\n"]))
+        assert stream.read(size) == "abc\ndef\n"
+        assert stream.read(size) == ""
@@ -0,0 +1,133 @@
+from pathlib import Path
+from typing import Any, Dict, Generator, Optional
+
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers import generate_uuid
+from flask_batteries_included.sqldb import db
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import QueuePool
+
+from dhos_audit_api.helpers.metrics import InstrumentedQueuePool, _instrument_pool
+from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
+
+
+def _sample(name: str, labels: Optional[Dict[str, str]] = None) -> float:
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+class TestMetrics:
+    @pytest.fixture()
+    def app(self, mocker: Any) -> Flask:
+        """Fixture that creates app for testing, listing events through the ORM"""
+        from dhos_audit_api.app import create_app
+        from dhos_audit_api.config import Configuration
+
+        mocker.patch.object(Configuration, "AUDIT_EVENTS_JSON_FROM_DATABASE", False)
+        return create_app(testing=True, use_pgsql=True, use_sqlite=False)
+
+    @pytest.fixture(autouse=True)
+    def cleanup(self, app: Flask) -> Generator[None, None, None]:
+        yield
+        with app.app_context():
+            Event.query.delete()
+            EventStats.query.delete()
+            db.session.commit()
+
+    def test_events_written(self, client: Any, mock_bearer_validation: Any) -> None:
+        event_type: str = f"Metrics {generate_uuid()}"
+        event: Dict = {"event_type": event_type, "event_data": {}}
+        client.post(
+            "/dhos/v2/event", json=event, headers={"Authorization": "Bearer TOKEN"}
+        )
+        client.post(
+            "/dhos/v2/events",
+            json=[event, event],
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert _sample("audit_events_written_total", {"event_type": event_type}) == 3
+
+    def test_query_metrics(self, client: Any, mock_bearer_validation: Any) -> None:
+        rows_before: float = _sample("audit_query_rows_count", {"query": "get_events"})
+        statements_before: float = _sample(
+            "audit_sql_statement_seconds_count", {"operation": "SELECT"}
+        )
+
+        response = client.get(
+            "/dhos/v2/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+
+        assert (
+            _sample("audit_query_rows_count", {"query": "get_events"})
+            == rows_before + 1
+        )
+        assert (
+            _sample("audit_sql_statement_seconds_count", {"operation": "SELECT"})
+            > statements_before
+        )
+
+    def test_checkout_metrics(
+        self, app: Flask, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        with app.app_context():
+            if not isinstance(db.engine.pool, InstrumentedQueuePool):
+                pytest.skip("SQLite databases are not pooled")
+        checkouts_before: float = _sample(
+            "audit_db_pool_checkout_seconds_count", {"pool": "primary"}
+        )
+        response = client.get(
+            "/dhos/v2/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert (
+            _sample("audit_db_pool_checkout_seconds_count", {"pool": "primary"})
+            > checkouts_before
+        )
+
+    def test_failed_statement(self, app: Flask) -> None:
+        with app.app_context():
+            with db.engine.connect() as connection:
+                with pytest.raises(DBAPIError):
+                    connection.execute(text("SELECT * FROM no_such_table"))
+                assert "metrics_statement_start" not in connection.info
+
+    def test_pool_metrics(self, tmp_path: Path) -> None:
+        engine: Engine = create_engine(
+            f"sqlite:///{tmp_path}/pool.db",
+            poolclass=InstrumentedQueuePool,
+            pool_size=2,
+            max_overflow=2,
+        )
+        _instrument_pool("test", engine, max_overflow=2)
+        labels: Dict[str, str] = {"pool": "test"}
+
+        with engine.connect():
+            assert _sample("audit_db_pool_saturation", labels) == 0.25
+            assert (
+                _sample("audit_db_pool_connections", {**labels, "state": "checked_out"})
+                == 1
+            )
+        assert _sample("audit_db_pool_saturation", labels) == 0
+        assert _sample("audit_db_pool_connections", {**labels, "state": "idle"}) == 1
+        assert _sample("audit_db_pool_checkout_seconds_count", labels) == 1
+
+        # Disposing of the engine replaces its pool, which is still instrumented.
+        engine.dispose()
+        assert _sample("audit_db_pool_connections", {**labels, "state": "idle"}) == 0
+        with engine.connect():
+            assert _sample("audit_db_pool_saturation", labels) == 0.25
+        assert _sample("audit_db_pool_checkout_seconds_count", labels) == 2
+        engine.dispose()
+        for pool_event in ("connect", "close"):
+            assert (
+                _sample(
+                    "audit_db_pool_connection_events_total",
+                    {**labels, "event": pool_event},
+                )
+                == 2
+            )
@@ -0,0 +1,188 @@
+from typing import Dict, Generator, List
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from dhos_audit_api.helpers.migrations import (
+    CREATE_PROGRESS_TABLE,
+    PROGRESS_TABLE,
+    create_index_concurrently,
+    rewrite_event_data,
+    table_partitions,
+)
+from dhos_audit_api.models.event import Event
+from tests.conftest import CommonValues as Vals
+
+RENAME_SOURCE = (
+    "event_data - 'source' || jsonb_build_object('origin', event_data -> 'source')"
+)
+
+
+@pytest.mark.usefixtures("app_context")
+class TestRewriteEventData:
+    @pytest.fixture(autouse=True)
+    def postgres_only(self) -> None:
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("Event data rewrites run against PostgreSQL only")
+
+    @pytest.fixture
+    def test_events(self) -> Generator[None, None, None]:
+        db.session.add_all(
+            Event(
+                uuid=uuid,
+                created_by_=Vals.SOMEONE_AWESOME,
+                modified_by_=Vals.SOMEONE_AWESOME,
+                event_type=Vals.LOGIN_SUCCESS,
+                event_data=event_data,
+            )
+            for uuid, event_data in [
+                (Vals.UUID_1, {"source": Vals.SOMEONE_AWESOME}),
+                (Vals.UUID_2, {"source": Vals.SOMEONE_ELSE}),
+                (Vals.UUID_3, {"target": Vals.SOMEONE_ELSE}),
+            ]
+        )
+        db.session.commit()
+
+        yield
+
+        Event.query.delete()
+        db.session.commit()
+
+    def event_data(self) -> Dict[str, Dict]:
+        db.session.expire_all()
+        # Only the fixture's events, whatever other tests have left behind.
+        events: List[Event] = Event.query.filter(
+            Event.uuid.in_([Vals.UUID_1, Vals.UUID_2, Vals.UUID_3])
+        ).all()
+        return {e.uuid: e.event_data for e in events}
+
+    @pytest.mark.parametrize(["chunk_size", "workers"], [(1, 1), (2, 3), (10, 16)])
+    def test_rewrite(self, test_events: None, chunk_size: int, workers: int) -> None:
+        updated: int = rewrite_event_data(
+            db.engine,
+            "test_rewrite",
+            RENAME_SOURCE,
+            where="event_data ? 'source'",
+            chunk_size=chunk_size,
+            workers=workers,
+        )
+        assert updated == 2
+        assert self.event_data() == {
+            Vals.UUID_1: {"origin": Vals.SOMEONE_AWESOME},
+            Vals.UUID_2: {"origin": Vals.SOMEONE_ELSE},
+            Vals.UUID_3: {"target": Vals.SOMEONE_ELSE},
+        }
+        assert (
+            db.session.execute(
+                text("SELECT to_regclass(:t)"), {"t": PROGRESS_TABLE}
+            ).scalar()
+            is None
+        )
+
+    def test_rewrite_resumes(self, test_events: None) -> None:
+        # As left by an interrupted rewrite that had got as far as UUID_1.
+        db.session.execute(text(CREATE_PROGRESS_TABLE))
+        db.session.execute(
+            text(
+                f"INSERT INTO {PROGRESS_TABLE} (job, lower_uuid, last_uuid, rows_updated) "
+                "VALUES ('test_resume', '', :last_uuid, 1)"
+            ),
+            {"last_uuid": Vals.UUID_1},
+        )
+        db.session.commit()
+
+        updated: int = rewrite_event_data(
+            db.engine, "test_resume", RENAME_SOURCE, where="event_data ? 'source'"
+        )
+        assert updated == 2
+        event_data: Dict[str, Dict] = self.event_data()
+        assert event_data[Vals.UUID_1] == {"source": Vals.SOMEONE_AWESOME}
+        assert event_data[Vals.UUID_2] == {"origin": Vals.SOMEONE_ELSE}
+
+
+@pytest.mark.usefixtures("app_context")
+class TestCreateIndexConcurrently:
+    @pytest.fixture(autouse=True)
+    def postgres_only(self) -> None:
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("Concurrent index builds run against PostgreSQL only")
+
+    @pytest.fixture
+    def connection(self) -> Generator[Connection, None, None]:
+        connection: Connection = db.engine.connect()
+        connection.execute(
+            text(
+                "CREATE TABLE test_plain (value int);"
+                "CREATE TABLE test_partitioned (value int) PARTITION BY RANGE (value);"
+                "CREATE TABLE test_partitioned_low PARTITION OF test_partitioned "
+                "FOR VALUES FROM (0) TO (10);"
+                "CREATE TABLE test_partitioned_high PARTITION OF test_partitioned "
+                "FOR VALUES FROM (10) TO (20);"
+                "INSERT INTO test_plain VALUES (1), (2), (2);"
+                "INSERT INTO test_partitioned VALUES (1), (12);"
+            )
+        )
+        with Operations.context(MigrationContext.configure(connection)):
+            yield connection
+        connection.execute(text("DROP TABLE test_plain, test_partitioned"))
+        connection.close()
+
+    def index_validity(self, connection: Connection, table: str) -> Dict[str, bool]:
+        return dict(
+            connection.execute(
+                text(
+                    "SELECT c.relname, i.indisvalid FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname LIKE :pattern"
+                ),
+                {"pattern": f"{table}%"},
+            ).all()
+        )
+
+    def test_plain_table(self, connection: Connection) -> None:
+        create_index_concurrently("test_plain_ix", "test_plain", "(value)")
+        # Already built, so nothing to do.
+        create_index_concurrently("test_plain_ix", "test_plain", "(value)")
+        assert self.index_validity(connection, "test_plain_ix") == {
+            "test_plain_ix": True
+        }
+
+    def test_partitioned_table(self, connection: Connection) -> None:
+        for _ in range(2):
+            # Running it again, as after an interruption, keeps what was built.
+            create_index_concurrently(
+                "test_partitioned_ix_value", "test_partitioned", "(value)"
+            )
+        assert table_partitions(connection, "test_partitioned") == [
+            "test_partitioned_high",
+            "test_partitioned_low",
+        ]
+        # The parent index only becomes valid once every partition has its index.
+        assert self.index_validity(connection, "test_partitioned") == {
+            "test_partitioned_ix_value": True,
+            "test_partitioned_low_test_partitioned_ix_value": True,
+            "test_partitioned_high_test_partitioned_ix_value": True,
+        }
+
+    def test_replaces_invalid_index(self, connection: Connection) -> None:
+        # A failed concurrent build leaves an invalid index behind. Concurrent builds
+        # can't run in a transaction.
+        with pytest.raises(DBAPIError):
+            connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+                text(
+                    "CREATE UNIQUE INDEX CONCURRENTLY test_plain_ix ON test_plain (value)"
+                )
+            )
+        assert self.index_validity(connection, "test_plain_ix") == {
+            "test_plain_ix": False
+        }
+
+        create_index_concurrently("test_plain_ix", "test_plain", "(value)")
+        assert self.index_validity(connection, "test_plain_ix") == {
+            "test_plain_ix": True
+        }
@@ -0,0 +1,138 @@
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Generator, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from dhos_audit_api.helpers import maintenance
+from dhos_audit_api.helpers.maintenance import PARTITION_MAINTENANCE_LOCK, run_task
+from dhos_audit_api.helpers.migrations import table_partitions
+from dhos_audit_api.helpers.partitions import create_event_partitions
+from dhos_audit_api.models.event import Event
+from tests.conftest import CommonValues as Vals
+
+PARTITION_MIGRATION: Path = (
+    Path(__file__).parents[1]
+    / "migrations"
+    / "versions"
+    / "57226ea15116_partition_event_table_by_month.py"
+)
+
+
+def _load_migration() -> Any:
+    spec: Any = importlib.util.spec_from_file_location(
+        "partition_migration", PARTITION_MIGRATION
+    )
+    migration: Any = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+@pytest.mark.usefixtures("app_context")
+class TestEventPartitions:
+    @pytest.fixture(autouse=True)
+    def partitioned_event_table(self) -> Generator[None, None, None]:
+        """
+        Swaps the test database's event table for an empty partitioned one with just
+        the default partition, and the partition functions of the migration.
+        """
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("Event partitions exist in PostgreSQL only")
+        db.session.execute(
+            text(
+                "ALTER TABLE event RENAME TO event_unpartitioned;"
+                "CREATE TABLE event (LIKE event_unpartitioned INCLUDING DEFAULTS)"
+                " PARTITION BY RANGE (created);"
+                "CREATE TABLE event_default PARTITION OF event DEFAULT;"
+            )
+        )
+        db.session.execute(text(_load_migration().CREATE_PARTITION_FUNCTIONS))
+        db.session.commit()
+
+        yield
+
+        db.session.rollback()
+        db.session.execute(
+            text(
+                "DROP TABLE event;"
+                "ALTER TABLE event_unpartitioned RENAME TO event;"
+                "DROP FUNCTION create_event_partitions(integer);"
+                "DROP FUNCTION create_event_partition(timestamp);"
+            )
+        )
+        db.session.commit()
+
+    def partitions(self) -> List[str]:
+        return table_partitions(db.session.connection(), "event")
+
+    def partition_of(self, uuid: str) -> str:
+        return db.session.execute(
+            text("SELECT tableoid::regclass::text FROM event WHERE uuid = :uuid"),
+            {"uuid": uuid},
+        ).scalar()
+
+    def test_create_event_partitions(self) -> None:
+        assert create_event_partitions(2) == 3
+        # Already in place, so nothing to do.
+        assert create_event_partitions(2) == 0
+        this_month: str = datetime.utcnow().strftime("event_%Y_%m")
+        assert this_month in self.partitions()
+        assert len(self.partitions()) == 4
+
+    def test_rows_move_out_of_the_default_partition(self) -> None:
+        db.session.add(
+            Event(
+                uuid=Vals.UUID_1,
+                created=datetime(2100, 1, 15),
+                created_by_=Vals.SOMEONE_AWESOME,
+                modified_by_=Vals.SOMEONE_AWESOME,
+                event_type=Vals.LOGIN_SUCCESS,
+                event_data={},
+            )
+        )
+        db.session.commit()
+        assert self.partition_of(Vals.UUID_1) == "event_default"
+
+        db.session.execute(text("SELECT create_event_partition('2100-01-01')"))
+        db.session.commit()
+        assert self.partition_of(Vals.UUID_1) == "event_2100_01"
+
+    def test_maintenance_runs_in_one_process_at_a_time(self) -> None:
+        # Another process running the maintenance holds its lock.
+        other_process: Connection = db.engine.connect()
+        other_process.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": PARTITION_MAINTENANCE_LOCK}
+        )
+        try:
+            assert not run_task(
+                PARTITION_MAINTENANCE_LOCK, lambda: create_event_partitions(1)
+            )
+            assert self.partitions() == ["event_default"]
+        finally:
+            other_process.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": PARTITION_MAINTENANCE_LOCK},
+            )
+            other_process.close()
+
+        assert run_task(PARTITION_MAINTENANCE_LOCK, lambda: create_event_partitions(1))
+        assert len(self.partitions()) == 3
+
+
+class TestScheduleTask:
+    def test_task_starts_with_the_first_request(self, app: Flask, mocker: Any) -> None:
+        start_task = mocker.patch.object(maintenance, "start_task")
+        task = mocker.Mock()
+        maintenance.schedule_task(app, "test-task", 60.0, 1, task)
+        # As in CLI commands and migrations, which serve no requests.
+        assert not start_task.called
+
+        client = app.test_client()
+        client.get("/running")
+        client.get("/running")
+        start_task.assert_called_once_with(app, "test-task", 60.0, 1, task)
@@ -0,0 +1,66 @@
+from typing import Dict, Iterator, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+from sqlalchemy.orm import Query
+
+from dhos_audit_api.blueprint_api.controller import _events_query
+from dhos_audit_api.helpers.explain import explain
+from tests.conftest import CommonValues as Vals
+
+
+def _plan_nodes(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.mark.usefixtures("app_context")
+class TestQueryPlan:
+    """
+    Guards against event listings falling back to sequential scans. The test table is
+    tiny, so sequential scans are disabled to see which index the planner would use.
+    """
+
+    @pytest.fixture(autouse=True)
+    def postgres_only(self) -> None:
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("Query plans are checked against PostgreSQL only")
+
+    def explain(self, query: Query) -> Dict:
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan: Dict = explain(query)
+        db.session.rollback()
+        return plan
+
+    @pytest.mark.parametrize(
+        ["creator", "event_type", "expected_index"],
+        [
+            (Vals.SOMEONE_AWESOME, None, "ix_event_created_by_created"),
+            (None, Vals.LOGIN_SUCCESS, "ix_event_event_type_created"),
+        ],
+    )
+    @pytest.mark.parametrize(
+        ["start_date", "end_date"],
+        [(None, None), ("2021-01-01", None), ("2021-01-01", "2021-01-07")],
+    )
+    def test_filtered_listing_uses_index(
+        self,
+        creator: Optional[str],
+        event_type: Optional[str],
+        expected_index: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+    ) -> None:
+        plan: Dict = self.explain(
+            _events_query(
+                creator=creator,
+                event_type=event_type,
+                start_date=start_date,
+                end_date=end_date,
+            )
+        )
+        nodes = list(_plan_nodes(plan))
+        assert not any(n["Node Type"] == "Seq Scan" for n in nodes)
+        assert expected_index in {n.get("Index Name") for n in nodes}
@@ -1,10 +1,19 @@
+import json
 from datetime import datetime, timedelta
 from typing import Any, Dict, Generator, List
 
 import pytest
+from flask import Flask
 from flask_batteries_included.sqldb import db
 
+from dhos_audit_api.helpers.stats_rollup import (
+    bucket_start,
+    compact_event_stats,
+    rebuild_event_stats,
+    record_event_stats,
+)
 from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
 from tests.conftest import CommonValues as Vals
 
 
@@ -171,6 +180,35 @@ class TestRead:
         assert obj["event_type"] == Vals.LOGIN_SUCCESS
         assert obj["event_data"]["description"] == Vals.LOGIN_SUCCESS_DESCRIPTION
 
+    def test_filter_by_event_data(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event?event_data[source]={Vals.SOMEONE_AWESOME}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert sorted(obj["uuid"] for obj in response.json) == [
+            Vals.UUID_1,
+            Vals.UUID_2,
+        ]
+
+        response = client.get(
+            f"/dhos/v2/event?event_data[source]={Vals.SOMEONE_AWESOME}"
+            f"&event_data[target]={Vals.SOMEONE_EQUALLY_AWESOME}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert [obj["uuid"] for obj in response.json] == [Vals.UUID_2]
+
+        response = client.get(
+            f"/dhos/v2/event?event_data[source]={Vals.SOMEONE_ELSE}"
+            f"&event_type={Vals.LOGIN_FAILURE}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == []
+
     def test_filter_by_type_and_start_date_(
         self, client: Any, test_events: List[Event], mock_bearer_validation: Any
     ) -> None:
@@ -233,6 +271,345 @@ class TestRead:
         assert obj["event_type"] == Vals.LOGIN_FAILURE
         assert obj["event_data"]["description"] == Vals.LOGIN_FAILURE_DESCRIPTION
 
+    @pytest.fixture
+    def midnight_event(self) -> Generator[Event, None, None]:
+        # Created and modified are set separately, so they can fall either side of
+        # midnight.
+        event = Event(
+            uuid=Vals.UUID_1,
+            created=datetime(2020, 6, 1, 23, 59, 59, 999999),
+            created_by_=Vals.SOMEONE_AWESOME,
+            modified=datetime(2020, 6, 2, 0, 0, 0, 1),
+            modified_by_=Vals.SOMEONE_AWESOME,
+            event_type=Vals.LOGIN_SUCCESS,
+            event_data={},
+        )
+        db.session.add(event)
+        db.session.commit()
+
+        yield event
+
+        db.session.delete(event)
+        db.session.commit()
+
+    @pytest.mark.parametrize(
+        ["query", "expected"],
+        [
+            ("?start_date=2020-06-01&end_date=2020-06-01", [Vals.UUID_1]),
+            ("?end_date=2020-06-01", [Vals.UUID_1]),
+            ("?start_date=2020-06-02", []),
+            ("?start_date=2020-06-02&end_date=2020-06-02", []),
+        ],
+    )
+    def test_dates_filter_on_created(
+        self,
+        client: Any,
+        midnight_event: Event,
+        mock_bearer_validation: Any,
+        query: str,
+        expected: List[str],
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event{query}", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert [e["uuid"] for e in response.json] == expected
+
+    @pytest.mark.parametrize(
+        ["query", "expected"],
+        [
+            ("", 3),
+            (f"?creator={Vals.SOMEONE_AWESOME}", 2),
+            (f"?event_type={Vals.LOGIN_FAILURE}", 1),
+            (f"?event_data[source]={Vals.SOMEONE_ELSE}", 1),
+            ("?creator=nobody", 0),
+        ],
+    )
+    def test_count(
+        self,
+        client: Any,
+        test_events: List[Event],
+        mock_bearer_validation: Any,
+        query: str,
+        expected: int,
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event/count{query}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == {"count": expected, "approximate": False}
+
+    def test_count_approximate(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event/count?approximate=true",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert isinstance(response.json["count"], int)
+
+    @pytest.fixture
+    def event_stats(self, test_events: List[Event]) -> Generator[None, None, None]:
+        # The fixture events are inserted directly, bypassing the stats rollup.
+        now: datetime = datetime.utcnow()
+        rebuild_event_stats(now - timedelta(days=7), now + timedelta(days=1))
+        yield
+        EventStats.query.delete()
+        db.session.commit()
+
+    def test_stats(
+        self,
+        client: Any,
+        test_events: List[Event],
+        event_stats: None,
+        mock_bearer_validation: Any,
+    ) -> None:
+        days: List[str] = [
+            e.created.strftime("%Y-%m-%dT00:00:00.000Z") for e in test_events
+        ]
+        start_date: str = (datetime.utcnow() - timedelta(days=3)).strftime("%Y-%m-%d")
+        end_date: str = datetime.utcnow().strftime("%Y-%m-%d")
+        response = client.get(
+            f"/dhos/v2/event/stats?bucket=day&start_date={start_date}&end_date={end_date}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == [
+            {"bucket_start": days[2], "event_type": Vals.LOGIN_SUCCESS, "count": 1},
+            {"bucket_start": days[1], "event_type": Vals.LOGIN_FAILURE, "count": 1},
+            {"bucket_start": days[0], "event_type": Vals.LOGIN_SUCCESS, "count": 1},
+        ]
+
+    def test_stats_compacted(
+        self,
+        client: Any,
+        test_events: List[Event],
+        event_stats: None,
+        mock_bearer_validation: Any,
+    ) -> None:
+        event: Event = test_events[0]
+        created, event_type = event.created, event.event_type
+        for _ in range(2):
+            record_event_stats(db.session, [(created, event_type, event.created_by_)])
+            db.session.commit()
+        rollup = EventStats.query.filter_by(
+            bucket_start=bucket_start(created), event_type=event_type
+        )
+        assert rollup.count() == 3
+
+        assert compact_event_stats() == 1
+        assert [stats.count for stats in rollup] == [3]
+        day: str = datetime.utcnow().strftime("%Y-%m-%d")
+        response = client.get(
+            f"/dhos/v2/event/stats?bucket=hour&start_date={day}&end_date={day}"
+            f"&event_type={event_type}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.json == [
+            {
+                "bucket_start": created.strftime("%Y-%m-%dT%H:00:00.000Z"),
+                "event_type": event_type,
+                "count": 3,
+            }
+        ]
+
+    @pytest.mark.parametrize(
+        ["bucket", "bucket_format"],
+        [("minute", "%Y-%m-%dT%H:%M:00.000Z"), ("hour", "%Y-%m-%dT%H:00:00.000Z")],
+    )
+    def test_stats_filtered(
+        self,
+        client: Any,
+        test_events: List[Event],
+        event_stats: None,
+        mock_bearer_validation: Any,
+        bucket: str,
+        bucket_format: str,
+    ) -> None:
+        bucket_start: str = test_events[0].created.strftime(bucket_format)
+        start_date: str = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+        end_date: str = datetime.utcnow().strftime("%Y-%m-%d")
+        response = client.get(
+            f"/dhos/v2/event/stats?bucket={bucket}&start_date={start_date}"
+            f"&end_date={end_date}&event_type={Vals.LOGIN_SUCCESS}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == [
+            {"bucket_start": bucket_start, "event_type": Vals.LOGIN_SUCCESS, "count": 1}
+        ]
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "?start_date=2020-01-01",
+            "?start_date=2020-01-01&end_date=2020-01-02&bucket=week",
+        ],
+    )
+    def test_stats_invalid(
+        self, client: Any, mock_bearer_validation: Any, query: str
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event/stats{query}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    def test_paginate(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event?limit=2",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert [obj["uuid"] for obj in response.json] == [Vals.UUID_3, Vals.UUID_1]
+        link: str = response.headers["Link"]
+        assert link.endswith('>; rel="next"')
+        next_page: str = link[1 : -len('>; rel="next"')]
+        assert next_page.startswith("/dhos/v2/event?limit=2&after=")
+
+        response = client.get(next_page, headers={"Authorization": "Bearer TOKEN"})
+        assert response.status_code == 200
+        assert [obj["uuid"] for obj in response.json] == [Vals.UUID_2]
+        assert "Link" not in response.headers
+
+    def test_paginate_with_filter(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event?creator={Vals.SOMEONE_AWESOME}&limit=1",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert [obj["uuid"] for obj in response.json] == [Vals.UUID_1]
+
+        next_page: str = response.headers["Link"][1 : -len('>; rel="next"')]
+        response = client.get(next_page, headers={"Authorization": "Bearer TOKEN"})
+        assert [obj["uuid"] for obj in response.json] == [Vals.UUID_2]
+
+    def test_sparse_fields(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event?creator={Vals.SOMEONE_AWESOME}"
+            "&fields=uuid,event_type,event_data.target",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert sorted(response.json, key=lambda e: e["uuid"]) == [
+            {"uuid": Vals.UUID_1, "event_type": Vals.LOGIN_SUCCESS},
+            {
+                "uuid": Vals.UUID_2,
+                "event_type": Vals.LOGIN_FAILURE,
+                "event_data": {"target": Vals.SOMEONE_EQUALLY_AWESOME},
+            },
+        ]
+
+    def test_sparse_fields_single_event(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event/{Vals.UUID_1}?fields=created,event_data,event_data.source",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert set(response.json) == {"created", "event_data"}
+        assert response.json["event_data"] == {
+            "description": Vals.LOGIN_SUCCESS_DESCRIPTION,
+            "source": Vals.SOMEONE_AWESOME,
+        }
+
+        response = client.get(
+            f"/dhos/v2/event/{Vals.UUID_1}?fields=not_a_field",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    def test_paginate_sparse_fields(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event?limit=2&fields=event_type",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.json == [
+            {"event_type": Vals.LOGIN_SUCCESS},
+            {"event_type": Vals.LOGIN_SUCCESS},
+        ]
+
+        next_page: str = response.headers["Link"][1 : -len('>; rel="next"')]
+        response = client.get(next_page, headers={"Authorization": "Bearer TOKEN"})
+        assert response.json == [{"event_type": Vals.LOGIN_FAILURE}]
+
+    def test_paginate_invalid_cursor(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event?limit=2&after=not-a-cursor",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    def test_stream_ndjson(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            f"/dhos/v2/event?creator={Vals.SOMEONE_AWESOME}",
+            headers={
+                "Authorization": "Bearer TOKEN",
+                "Accept": "application/x-ndjson",
+            },
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines: List[Dict] = [json.loads(line) for line in response.data.splitlines()]
+        assert {obj["uuid"] for obj in lines} == {Vals.UUID_1, Vals.UUID_2}
+        for obj in lines:
+            assert obj["created_by"] == Vals.SOMEONE_AWESOME
+
+    @pytest.mark.parametrize(
+        "query", ["", "?limit=2", "?limit=5", "?format=ndjson", "?creator=nobody"]
+    )
+    def test_json_from_database_matches_orm(
+        self,
+        app: Flask,
+        client: Any,
+        test_events: List[Event],
+        mock_bearer_validation: Any,
+        query: str,
+    ) -> None:
+        responses: List[Any] = []
+        for json_from_database in (True, False):
+            app.config["AUDIT_EVENTS_JSON_FROM_DATABASE"] = json_from_database
+            response = client.get(
+                f"/dhos/v2/event{query}", headers={"Authorization": "Bearer TOKEN"}
+            )
+            assert response.status_code == 200
+            responses.append(response)
+
+        from_database, from_orm = responses
+        assert from_database.mimetype == from_orm.mimetype
+        assert from_database.headers.get("Link") == from_orm.headers.get("Link")
+        assert [json.loads(line) for line in from_database.data.splitlines()] == [
+            json.loads(line) for line in from_orm.data.splitlines()
+        ]
+
+    def test_stream_ndjson_format_param_v1(
+        self, client: Any, test_events: List[Event], mock_bearer_validation: Any
+    ) -> None:  # TODO: PLAT-615
+        response = client.get(
+            f"/dhos/v1/event?type={Vals.LOGIN_FAILURE}&format=ndjson",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines: List[Dict] = [json.loads(line) for line in response.data.splitlines()]
+        assert len(lines) == 1
+        assert lines[0]["uuid"] == Vals.UUID_2
+        assert lines[0]["description"] == Vals.LOGIN_FAILURE_DESCRIPTION
+
     def test_get_non_existent(self, client: Any, mock_bearer_validation: Any) -> None:
         response = client.get(
             "/dhos/v1/event/qwerty123",
@@ -418,3 +795,86 @@ class TestRead:
         assert obj["modified_by"] == Vals.SOMEONE_AWESOME
         assert obj["type"] == Vals.LOGIN_FAILURE
         assert obj["description"] == Vals.LOGIN_FAILURE_DESCRIPTION
+
+    def test_list_v1_matches_to_dict_v1(
+        self,
+        app: Flask,
+        client: Any,
+        test_events: List[Event],
+        mock_bearer_validation: Any,
+    ) -> None:  # TODO: PLAT-615
+        response = client.get(
+            "/dhos/v1/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        with app.app_context():
+            expected: List[Dict] = json.loads(
+                app.json.dumps([event.to_dict_v1() for event in Event.query.all()])
+            )
+        assert sorted(response.json, key=lambda e: e["uuid"]) == sorted(
+            expected, key=lambda e: e["uuid"]
+        )
+
+    @pytest.mark.parametrize(
+        "event_data",
+        [
+            {"description": None, "target": None},
+            {"description": 3, "target": 4.5},
+            {"description": True, "target": [Vals.UUID_1]},
+            {"description": {"text": "nested"}, "target": {"uuid": Vals.UUID_1}},
+            {"target": "", "other": "caf\u00e9"},
+        ],
+    )
+    def test_list_v1_keeps_json_types(
+        self,
+        app: Flask,
+        client: Any,
+        mock_bearer_validation: Any,
+        event_data: Dict,
+    ) -> None:  # TODO: PLAT-615
+        # Events created through v2 can hold any JSON in description and target.
+        event = Event(
+            uuid=Vals.UUID_3,
+            created_by_=Vals.SOMEONE_ELSE,
+            modified_by_=Vals.SOMEONE_ELSE,
+            event_type=Vals.LOGIN_SUCCESS,
+            event_data=event_data,
+        )
+        db.session.add(event)
+        db.session.commit()
+        expected: Dict = json.loads(app.json.dumps(event.to_dict_v1()))
+
+        response = client.get(
+            "/dhos/v1/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert response.json == [expected]
+
+        Event.query.delete()
+        db.session.commit()
+
+    def test_list_v1_without_description(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:  # TODO: PLAT-615
+        event_data: Dict = {"patient_id": Vals.UUID_1, "clinician_id": Vals.UUID_2}
+        db.session.add(
+            Event(
+                uuid=Vals.UUID_3,
+                created_by_=Vals.SOMEONE_ELSE,
+                modified_by_=Vals.SOMEONE_ELSE,
+                event_type=Vals.LOGIN_SUCCESS,
+                event_data=event_data,
+            )
+        )
+        db.session.commit()
+
+        response = client.get(
+            "/dhos/v1/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert len(response.json) == 1
+        assert json.loads(response.json[0]["description"]) == event_data
+        assert "target" not in response.json[0]
+
+        Event.query.delete()
+        db.session.commit()
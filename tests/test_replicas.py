@@ -0,0 +1,168 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
+
+import pytest
+from flask import Flask
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from dhos_audit_api.helpers import replicas
+from dhos_audit_api.models.event import Event
+from tests.conftest import CommonValues as Vals
+
+HEADERS: Dict = {"Authorization": "Bearer TOKEN"}
+REPLICA_SCHEMA = "test_read_replica"
+
+
+def _event(uuid: str) -> Event:
+    return Event(
+        uuid=uuid,
+        created_by_=Vals.SOMEONE_AWESOME,
+        modified_by_=Vals.SOMEONE_AWESOME,
+        event_type=Vals.LOGIN_SUCCESS,
+        event_data={"description": Vals.LOGIN_SUCCESS_DESCRIPTION},
+    )
+
+
+def _replica_url(tmp_path: Path) -> str:
+    """
+    The primary's engine options apply to every bind, so with a PostgreSQL primary
+    the replica is a schema of the same database rather than a SQLite file.
+    """
+    from dhos_audit_api.app import create_app
+
+    primary_url: str = create_app(
+        testing=True, use_pgsql=True, use_sqlite=False
+    ).config["SQLALCHEMY_DATABASE_URI"]
+    if not primary_url.startswith("postgresql"):
+        return f"sqlite:///{tmp_path}/r.db"
+    return (
+        make_url(primary_url)
+        .update_query_dict({"options": f"-csearch_path={REPLICA_SCHEMA}"})
+        .render_as_string(hide_password=False)
+    )
+
+
+class TestReadReplicas:
+    """
+    The replica is a separate database (or schema) holding different events from
+    the primary, to show where each request reads from.
+    """
+
+    max_staleness: float = 0.0
+
+    @pytest.fixture()
+    def app(self, mocker: Any, tmp_path: Path) -> Flask:
+        """Fixture that creates app for testing, with a read replica"""
+        from dhos_audit_api.app import create_app
+        from dhos_audit_api.config import Configuration
+
+        mocker.patch.object(
+            Configuration, "AUDIT_READ_REPLICA_URLS", [_replica_url(tmp_path)]
+        )
+        mocker.patch.object(
+            Configuration, "AUDIT_READ_REPLICA_MAX_STALENESS", self.max_staleness
+        )
+        mocker.patch.dict(replicas._last_writes, clear=True)
+        return create_app(testing=True, use_pgsql=True, use_sqlite=False)
+
+    @pytest.fixture
+    def test_events(self, app: Flask) -> Generator[None, None, None]:
+        with app.app_context():
+            db.session.add(_event(Vals.UUID_1))
+            if db.engine.dialect.name == "postgresql":
+                db.session.execute(text(f"CREATE SCHEMA {REPLICA_SCHEMA}"))
+            db.session.commit()
+            replica = db.get_engine(bind=f"{replicas.READ_REPLICA_BIND_PREFIX}0")
+            db.Model.metadata.create_all(replica)
+            session = db.create_scoped_session({"bind": replica, "binds": {}})
+            session.add(_event(Vals.UUID_2))
+            session.commit()
+            session.remove()
+
+        yield
+
+        with app.app_context():
+            db.get_engine(bind=f"{replicas.READ_REPLICA_BIND_PREFIX}0").dispose()
+            Event.query.delete()
+            if db.engine.dialect.name == "postgresql":
+                db.session.execute(text(f"DROP SCHEMA {REPLICA_SCHEMA} CASCADE"))
+            db.session.commit()
+
+    def test_get_reads_from_replica(
+        self, client: Any, test_events: None, mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(f"/dhos/v2/event/{Vals.UUID_2}", headers=HEADERS)
+        assert response.status_code == 200
+        response = client.get(f"/dhos/v2/event/{Vals.UUID_1}", headers=HEADERS)
+        assert response.status_code == 404
+
+    def test_post_writes_to_primary(
+        self, app: Flask, client: Any, test_events: None, mock_bearer_validation: Any
+    ) -> None:
+        response = client.post(
+            "/dhos/v2/event",
+            json={"event_type": Vals.LOGIN_FAILURE, "event_data": {}},
+            headers=HEADERS,
+        )
+        assert response.status_code == 201
+        with app.app_context():
+            assert Event.query.count() == 2
+
+        # Without a staleness bound, the client reads from the replica straight away.
+        response = client.get("/dhos/v2/event", headers=HEADERS)
+        assert [e["uuid"] for e in response.json] == [Vals.UUID_2]
+
+
+class TestReadReplicasWithStalenessBound(TestReadReplicas):
+    max_staleness = 60.0
+
+    def test_post_writes_to_primary(
+        self, app: Flask, client: Any, test_events: None, mock_bearer_validation: Any
+    ) -> None:
+        response = client.post(
+            "/dhos/v2/event",
+            json={"event_type": Vals.LOGIN_FAILURE, "event_data": {}},
+            headers=HEADERS,
+        )
+        assert response.status_code == 201
+
+        # The client reads its own write from the primary.
+        response = client.get("/dhos/v2/event", headers=HEADERS)
+        assert len(response.json) == 2
+        assert Vals.UUID_2 not in {e["uuid"] for e in response.json}
+
+
+class TestReplicationLag:
+    @pytest.fixture(autouse=True)
+    def lags(self, mocker: Any) -> None:
+        mocker.patch.dict(replicas._lags, clear=True)
+
+    def test_one_request_checks_at_a_time(self, mocker: Any) -> None:
+        checking = threading.Event()
+        finish_check = threading.Event()
+
+        def slow_check(bind: str, engine: Any) -> float:
+            checking.set()
+            finish_check.wait(5)
+            return 0.5
+
+        measure_lag = mocker.patch.object(
+            replicas, "_measure_lag", side_effect=slow_check
+        )
+        lags: List[Optional[float]] = []
+        checker = threading.Thread(
+            target=lambda: lags.append(replicas._replication_lag("replica", None))
+        )
+        checker.start()
+        assert checking.wait(5)
+
+        # Meanwhile, other requests don't wait for the check, nor start their own.
+        assert replicas._replication_lag("replica", None) is None
+        finish_check.set()
+        checker.join()
+        assert lags == [0.5]
+        assert replicas._replication_lag("replica", None) == 0.5
+        assert measure_lag.call_count == 1
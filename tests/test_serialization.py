@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from flask_batteries_included.helpers.timestamp import parse_datetime_to_iso8601
+
+from dhos_audit_api.helpers.serialization import OrjsonProvider, format_datetime
+from tests.conftest import CommonValues as Vals
+
+
+@pytest.mark.usefixtures("app_context")
+class TestSerialization:
+    event: Dict = {
+        "uuid": Vals.UUID_1,
+        "created": datetime(2020, 6, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+        "created_by": Vals.SOMEONE_AWESOME,
+        "modified": datetime(2020, 6, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+        "modified_by": Vals.SOMEONE_AWESOME,
+        "event_type": Vals.LOGIN_SUCCESS,
+        "event_data": {"description": "Über", "target": None, "count": 3},
+    }
+
+    def test_app_uses_orjson(self, app: Flask) -> None:
+        assert isinstance(app.json, OrjsonProvider)
+
+    def test_matches_stdlib_output(self, app: Flask) -> None:
+        stdlib = DefaultJSONProvider(app)
+        assert app.json.loads(app.json.dumps(self.event)) == stdlib.loads(
+            stdlib.dumps(self.event)
+        )
+        assert app.json.response(self.event).json == stdlib.response(self.event).json
+
+    def test_formats_datetimes_like_stdlib(self, app: Flask) -> None:
+        assert app.json.loads(app.json.dumps(self.event))["created"] == (
+            "2020-06-01T12:00:00.123Z"
+        )
+
+    @pytest.mark.parametrize(
+        "dt",
+        [
+            datetime(2020, 6, 1, 12, 0, 0, 123456),
+            datetime(2020, 6, 1, 12, 0, 0, 999999, tzinfo=timezone.utc),
+            datetime(2020, 6, 1, 12, 0, 0, tzinfo=timezone(timedelta(hours=1))),
+            datetime(2020, 6, 1, 12, 0, 0, tzinfo=timezone(timedelta(hours=-5))),
+            datetime(999, 1, 1, tzinfo=timezone.utc),
+        ],
+    )
+    def test_format_datetime(self, dt: datetime) -> None:
+        assert format_datetime(dt) == parse_datetime_to_iso8601(dt)
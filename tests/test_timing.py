@@ -0,0 +1,132 @@
+from typing import Any, Dict, Generator
+
+import pytest
+from flask import Flask
+from flask_batteries_included.sqldb import db
+
+from dhos_audit_api.helpers import timing
+from dhos_audit_api.models.event import Event
+from tests.conftest import CommonValues as Vals
+
+
+def _server_timing(header: str) -> Dict[str, str]:
+    metrics: Dict[str, str] = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = ";".join(params)
+    return metrics
+
+
+class TestTiming:
+    @pytest.fixture()
+    def app(self, mocker: Any) -> Flask:
+        """Fixture that creates app for testing, with request timing enabled"""
+        from dhos_audit_api.app import create_app
+        from dhos_audit_api.config import Configuration
+
+        mocker.patch.object(Configuration, "AUDIT_REQUEST_TIMING", True)
+        return create_app(testing=True, use_pgsql=True, use_sqlite=False)
+
+    @pytest.fixture
+    def test_event(self, app: Flask) -> Generator[None, None, None]:
+        with app.app_context():
+            event = Event(
+                uuid=Vals.UUID_1,
+                created_by_=Vals.SOMEONE_AWESOME,
+                modified_by_=Vals.SOMEONE_AWESOME,
+                event_type=Vals.LOGIN_SUCCESS,
+                event_data={"description": Vals.LOGIN_SUCCESS_DESCRIPTION},
+            )
+            db.session.add(event)
+            db.session.commit()
+
+        yield
+
+        with app.app_context():
+            Event.query.delete()
+            db.session.commit()
+
+    def test_get_events_is_timed(
+        self, client: Any, test_event: None, mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event?limit=10", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        metrics: Dict[str, str] = _server_timing(response.headers["Server-Timing"])
+        assert {"sql", "query", "total"} <= set(metrics)
+        assert metrics["query"].endswith('desc="1 rows"')
+        assert metrics["total"].startswith("dur=")
+
+    def test_get_events_from_orm_is_timed(
+        self, app: Flask, client: Any, test_event: None, mock_bearer_validation: Any
+    ) -> None:
+        app.config["AUDIT_EVENTS_JSON_FROM_DATABASE"] = False
+        response = client.get(
+            "/dhos/v2/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        metrics: Dict[str, str] = _server_timing(response.headers["Server-Timing"])
+        assert set(metrics) == {"sql", "query", "to_dict", "serialize", "total"}
+        assert metrics["query"].endswith('desc="1 rows"')
+
+    def test_get_event_fields_is_timed(
+        self, client: Any, test_event: None, mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event?fields=uuid", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        metrics: Dict[str, str] = _server_timing(response.headers["Server-Timing"])
+        assert {"sql", "query", "serialize", "total"} <= set(metrics)
+        assert metrics["query"].endswith('desc="1 rows"')
+
+    @pytest.mark.parametrize("query", ["?format=ndjson", "?format=ndjson&fields=uuid"])
+    def test_streamed_events_are_logged(
+        self,
+        client: Any,
+        test_event: None,
+        mock_bearer_validation: Any,
+        mocker: Any,
+        query: str,
+    ) -> None:
+        mock_logger = mocker.patch.object(timing, "logger")
+        response = client.get(
+            f"/dhos/v2/event{query}", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        # The rows are only read as the body is, after the header was sent.
+        assert "query" not in _server_timing(response.headers["Server-Timing"])
+        assert len(response.data.splitlines()) == 1
+        response.close()
+
+        mock_logger.info.assert_called_once()
+        extra: Dict = mock_logger.info.call_args.kwargs["extra"]
+        assert extra["streamed"] is True
+        assert extra["rows"] == {"query": 1}
+        assert {"query", "total"} <= set(extra["timings_ms"])
+
+    def test_create_event_is_timed(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        response = client.post(
+            "/dhos/v2/event",
+            json={"event_type": Vals.LOGIN_SUCCESS, "event_data": {}},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 201
+        metrics: Dict[str, str] = _server_timing(response.headers["Server-Timing"])
+        assert {"validate", "insert", "rollup", "commit", "sql", "total"} <= set(
+            metrics
+        )
+
+
+class TestTimingDisabled:
+    def test_no_server_timing_header(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        response = client.get(
+            "/dhos/v2/event", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert "Server-Timing" not in response.headers
@@ -1,6 +1,8 @@
-from typing import Any, Dict
+from datetime import datetime
+from typing import Any, Dict, List
 
 import pytest
+from flask_batteries_included.helpers import generate_uuid
 
 from tests.conftest import CommonValues as Vals
 
@@ -77,6 +79,83 @@ class TestApi:
             else:
                 assert response_json[key] == value
 
+    def test_bulk_post(self, client: Any, mock_bearer_validation: Any) -> None:
+        payload: List[Dict] = [
+            {
+                "event_type": Vals.LOGIN_SUCCESS,
+                "event_data": {"clinician_uuid": Vals.SOMEONE_AWESOME},
+            },
+            {
+                "event_type": Vals.LOGIN_FAILURE,
+                "event_data": {"clinician_uuid": Vals.SOMEONE_ELSE},
+            },
+        ]
+        post_response = client.post(
+            "/dhos/v2/events",
+            json=payload,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert post_response.status_code == 201
+        event_uuids: List[str] = post_response.json
+        assert len(event_uuids) == len(payload)
+
+        for event_uuid, expected in zip(event_uuids, payload):
+            get_response = client.get(
+                f"/dhos/v2/event/{event_uuid}",
+                headers={"Authorization": "Bearer TOKEN"},
+            )
+            assert get_response.status_code == 200
+            assert get_response.json["event_type"] == expected["event_type"]
+            assert get_response.json["event_data"] == expected["event_data"]
+
+    def test_posts_are_counted_in_stats(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        event_type: str = f"Stats {generate_uuid()}"
+        event: Dict = {"event_type": event_type, "event_data": {}}
+        client.post(
+            "/dhos/v2/event", json=event, headers={"Authorization": "Bearer TOKEN"}
+        )
+        client.post(
+            "/dhos/v2/events",
+            json=[event, event],
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+
+        today: str = datetime.utcnow().strftime("%Y-%m-%d")
+        response = client.get(
+            f"/dhos/v2/event/stats?bucket=day&start_date={today}&end_date={today}"
+            f"&event_type={event_type}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == [
+            {
+                "bucket_start": f"{today}T00:00:00.000Z",
+                "event_type": event_type,
+                "count": 3,
+            }
+        ]
+
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            [],
+            [{"event_type": Vals.LOGIN_SUCCESS}],
+            [{"event_type": Vals.LOGIN_SUCCESS, "event_data": "not a dict"}],
+        ],
+        ids=["empty", "missing_event_data", "invalid_event_data"],
+    )
+    def test_bulk_post_fails_validation(
+        self, client: Any, mock_bearer_validation: Any, payload: List[Dict]
+    ) -> None:
+        response = client.post(
+            "/dhos/v2/events",
+            json=payload,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
     def test_fails_with_no_json_body_v1(
         self, client: Any, mock_bearer_validation: Any
     ) -> None:
@@ -0,0 +1,217 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Generator, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers import generate_uuid
+from flask_batteries_included.sqldb import db
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from dhos_audit_api.blueprint_api.write_behind import (
+    EventWriteQueue,
+    _encode_datetime,
+    get_queue,
+)
+from dhos_audit_api.helpers.stats_rollup import bucket_start
+from dhos_audit_api.models.event import Event
+from dhos_audit_api.models.event_stats import EventStats
+from tests.conftest import CommonValues as Vals
+
+
+@pytest.fixture()
+def app(tmp_path: Path, mocker: Any) -> Generator[Flask, None, None]:
+    """Fixture that creates app for testing, with the write-behind queue enabled"""
+    from dhos_audit_api.app import create_app
+    from dhos_audit_api.config import Configuration
+
+    mocker.patch.object(Configuration, "AUDIT_WRITE_BEHIND", True)
+    mocker.patch.object(Configuration, "AUDIT_WRITE_BEHIND_SPOOL_DIR", str(tmp_path))
+    mocker.patch.object(Configuration, "AUDIT_WRITE_BEHIND_QUEUE_SIZE", 2)
+    mocker.patch.object(Configuration, "AUDIT_WRITE_BEHIND_FLUSH_INTERVAL", 3600.0)
+
+    app = create_app(testing=True, use_pgsql=True, use_sqlite=False)
+    yield app
+
+    app.extensions["event_write_queue"].stop()
+
+
+class TestWriteBehind:
+    payload: Dict = {
+        "event_type": Vals.LOGIN_SUCCESS,
+        "event_data": {"clinician_uuid": Vals.SOMEONE_AWESOME},
+    }
+
+    def test_post_is_queued_until_flushed(
+        self, app: Flask, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        post_response = client.post(
+            "/dhos/v2/event",
+            json=self.payload,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert post_response.status_code == 202
+        location: str = post_response.headers["Location"]
+
+        get_response = client.get(location, headers={"Authorization": "Bearer TOKEN"})
+        assert get_response.status_code == 404
+
+        with app.app_context():
+            assert get_queue().flush() == 1
+
+        get_response = client.get(location, headers={"Authorization": "Bearer TOKEN"})
+        assert get_response.status_code == 200
+        assert get_response.json["event_data"] == self.payload["event_data"]
+
+    def test_post_when_queue_full(
+        self, client: Any, mock_bearer_validation: Any
+    ) -> None:
+        for _ in range(2):
+            response = client.post(
+                "/dhos/v2/event",
+                json=self.payload,
+                headers={"Authorization": "Bearer TOKEN"},
+            )
+            assert response.status_code == 202
+
+        response = client.post(
+            "/dhos/v2/event",
+            json=self.payload,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 429
+
+    def test_queue_starts_on_first_use(self, app: Flask, tmp_path: Path) -> None:
+        # Creating the app, as CLI commands and migrations do, leaves the spool alone.
+        assert list(tmp_path.iterdir()) == []
+        with app.app_context():
+            get_queue()
+        assert (tmp_path / "0" / "lock").exists()
+
+    @pytest.fixture
+    def queue_args(self, app: Flask, tmp_path: Path) -> Dict:
+        return {
+            "app": app,
+            "spool_dir": tmp_path / "recovery",
+            "max_size": 2,
+            "batch_size": 10,
+            "flush_interval": 3600.0,
+            "enqueue_timeout": 0.0,
+            "max_attempts": 2,
+        }
+
+    def test_running_queues_use_their_own_spool_dirs(self, queue_args: Dict) -> None:
+        first = EventWriteQueue(**queue_args)
+        second = EventWriteQueue(**queue_args)
+        first.start()
+        second.start()
+        try:
+            first.enqueue(self._row(generate_uuid()))
+            assert len(second) == 0
+            assert [p.name for p in queue_args["spool_dir"].iterdir()] == ["0", "1"]
+        finally:
+            second.stop()
+            first.stop()
+
+    def test_spooled_events_are_recovered(self, app: Flask, queue_args: Dict) -> None:
+        spool_dir: Path = queue_args["spool_dir"]
+        event_uuid: str = generate_uuid()
+        row: Dict = self._row(event_uuid)
+        # A segment left in an unlocked directory, as after a crash.
+        orphaned_dir: Path = spool_dir / "3"
+        orphaned_dir.mkdir(parents=True)
+        (orphaned_dir / "1-1.ndjson").write_text(
+            json.dumps(row, default=_encode_datetime) + "\n"
+        )
+
+        recovered = EventWriteQueue(**queue_args)
+        recovered.start()
+        try:
+            assert len(recovered) == 1
+            assert recovered.flush() == 1
+        finally:
+            recovered.stop()
+        assert list((spool_dir / "0").glob("*.ndjson")) == []
+        assert list(orphaned_dir.glob("*.ndjson")) == []
+
+        with app.app_context():
+            event: Event = db.session.get(Event, event_uuid)
+            assert event.created == row["created"]
+            assert event.event_data == self.payload["event_data"]
+            count: int = (
+                db.session.query(func.sum(EventStats.count))
+                .filter_by(
+                    bucket_start=bucket_start(row["created"]),
+                    event_type=Vals.LOGIN_SUCCESS,
+                    created_by_=Vals.SOMEONE_AWESOME,
+                )
+                .scalar()
+            )
+            assert count >= 1
+
+    def test_failing_rows_are_dead_lettered(self, app: Flask, queue_args: Dict) -> None:
+        queue = EventWriteQueue(**queue_args)
+        queue.start()
+        good_uuid: str = generate_uuid()
+        bad_uuid: str = generate_uuid()
+        try:
+            queue.enqueue(self._row(good_uuid))
+            queue.enqueue({**self._row(bad_uuid), "event_type": None})
+            with pytest.raises(IntegrityError):
+                queue.flush()
+            assert len(queue) == 2
+
+            # The second failure retries the rows one by one, and sets aside just
+            # the one that fails on its own.
+            assert queue.flush() == 1
+            assert len(queue) == 0
+            dead_letter_dir: Path = queue_args["spool_dir"] / "dead-letter"
+            dead_lettered: List[Path] = list(dead_letter_dir.glob("*.ndjson"))
+            assert len(dead_lettered) == 1
+            lines: List[str] = dead_lettered[0].read_text().splitlines()
+            assert [json.loads(line)["uuid"] for line in lines] == [bad_uuid]
+
+            # Rows queued after it are flushed as normal.
+            event_uuid: str = generate_uuid()
+            queue.enqueue(self._row(event_uuid))
+            assert queue.flush() == 1
+        finally:
+            queue.stop()
+
+        with app.app_context():
+            assert db.session.get(Event, good_uuid) is not None
+            assert db.session.get(Event, bad_uuid) is None
+            assert db.session.get(Event, event_uuid) is not None
+            Event.query.filter(Event.uuid.in_([good_uuid, event_uuid])).delete()
+            db.session.commit()
+
+    def test_unreachable_database_is_retried(
+        self, mocker: Any, queue_args: Dict
+    ) -> None:
+        queue = EventWriteQueue(**queue_args)
+        mocker.patch.object(
+            queue, "_insert", side_effect=OperationalError("INSERT", {}, Exception())
+        )
+        queue.start()
+        try:
+            queue.enqueue(self._row(generate_uuid()))
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    queue.flush()
+            assert len(queue) == 1
+            assert not (queue_args["spool_dir"] / "dead-letter").exists()
+        finally:
+            queue.stop()
+
+    def _row(self, event_uuid: str) -> Dict:
+        now = datetime.utcnow()
+        return {
+            "uuid": event_uuid,
+            "created": now,
+            "created_by_": Vals.SOMEONE_AWESOME,
+            "modified": now,
+            "modified_by_": Vals.SOMEONE_AWESOME,
+            **self.payload,
+        }